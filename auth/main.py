@@ -0,0 +1,204 @@
+# pyright: reportUnknownMemberType=false
+import json
+import os
+import re
+import threading
+import time
+from typing import Any
+
+import google.cloud.firestore  # type: ignore
+
+# The Firebase Admin SDK to access Cloud Firestore.
+from firebase_admin import firestore, initialize_app  # type: ignore
+
+# The Cloud Functions for Firebase SDK to create Cloud Functions and set up triggers.
+from firebase_functions import https_fn, options  # type: ignore
+from google.api_core.exceptions import AlreadyExists
+
+# Sign-in and sign-up are called every time the extension loads. They are deployed
+# as their own codebase so that their instances only load what they need and start
+# quickly, without the packages of the formatting functions.
+
+app = initialize_app()
+
+EXTENSION_ORIGIN = "chrome-extension://cgdpalglfipokmbjbofifdlhlkpcipnk"
+
+# Users are never deleted: known users can be cached for a while. Unknown users are
+# only cached briefly, they may sign up through another instance.
+USER_TTL = 300
+MISSING_USER_TTL = 5
+
+_db: google.cloud.firestore.Client | None = None
+_db_lock = threading.Lock()
+
+
+def get_db() -> google.cloud.firestore.Client:
+    global _db
+    if _db is None:
+        with _db_lock:
+            if _db is None:
+                _db = firestore.client(app)  # type: ignore
+    return _db
+
+
+# Deployed instances create the client while waiting for the first request.
+if os.getenv("K_SERVICE"):
+    threading.Thread(target=get_db, daemon=True).start()
+
+
+class ExistenceCache:
+    """Whether a user exists, kept in memory by each instance for a short time."""
+
+    def __init__(self, ttl: float, missing_ttl: float):
+        self.ttl = ttl
+        self.missing_ttl = missing_ttl
+        self._entries: dict[str, tuple[bool, float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, email: str) -> bool | None:
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is None:
+                return None
+            exists, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[email]
+                return None
+            return exists
+
+    def set(self, email: str, exists: bool) -> None:
+        ttl = self.ttl if exists else self.missing_ttl
+        with self._lock:
+            self._entries[email] = (exists, time.monotonic() + ttl)
+
+
+users_cache = ExistenceCache(USER_TTL, MISSING_USER_TTL)
+
+
+def user_exists(db: google.cloud.firestore.Client, email: str) -> bool:
+    exists = users_cache.get(email)
+    if exists is None:
+        exists = bool(db.collection("users").document(email).get().exists)
+        users_cache.set(email, exists)
+    return exists
+
+
+def create_user(db: google.cloud.firestore.Client, email: str) -> bool:
+    """
+    Create the document of a user if it doesn't exist yet. The existence check and
+    the write are a single atomic operation, so concurrent sign-ups can't both
+    succeed.
+
+    Args: db: The Firestore client. email (str): The email of the user.
+
+    Returns: Whether the user was created.
+    """
+    if users_cache.get(email):
+        return False
+
+    try:
+        db.collection("users").document(email).create({})
+        created = True
+    except AlreadyExists:
+        created = False
+
+    users_cache.set(email, True)
+    return created
+
+
+def get_email(req: https_fn.Request) -> tuple[str | None, https_fn.Response | None]:
+    json_data: dict[str, Any] = req.get_json()
+    data: dict[str, Any] = json_data.get("data", {})
+    user_email: str | None = data.get("email")
+
+    if not user_email:
+        return None, https_fn.Response("Email is required", status=400)
+
+    if not re.match(r"[^@]+@epfl\.ch$", user_email):
+        return None, https_fn.Response(
+            "Invalid email domain. Must be an EPFL email.", status=400
+        )
+
+    return user_email, None
+
+
+@https_fn.on_request(
+    cors=options.CorsOptions(
+        cors_origins=[EXTENSION_ORIGIN],
+        cors_methods=["POST"],
+    ),
+)
+def handle_sign_up(req: https_fn.Request) -> https_fn.Response:
+    if req.method != "POST":
+        return https_fn.Response("Method not allowed", status=405)
+
+    try:
+        user_email, error = get_email(req)
+        if user_email is None:
+            return error  # type: ignore
+
+        print("New user sign-up with email:", user_email)
+
+        if not create_user(get_db(), user_email):
+            return https_fn.Response("User already exists", status=400)
+
+        return https_fn.Response(
+            json.dumps(
+                {
+                    "data": {
+                        "success": True,
+                    }
+                }
+            ),
+            content_type="application/json",
+        )
+    except Exception as e:
+        print(f"Error handling sign-up: {str(e)}")
+        return https_fn.Response(json.dumps({"error": str(e)}), status=500)
+
+
+@https_fn.on_request(
+    cors=options.CorsOptions(
+        cors_origins=[EXTENSION_ORIGIN],
+        cors_methods=["POST"],
+    ),
+)
+def handle_sign_in(req: https_fn.Request) -> https_fn.Response:
+    if req.method != "POST":
+        return https_fn.Response("Method not allowed", status=405)
+
+    try:
+        user_email, error = get_email(req)
+        if user_email is None:
+            return error  # type: ignore
+
+        print("User sign-in with email:", user_email)
+
+        if user_exists(get_db(), user_email):
+            return https_fn.Response(
+                json.dumps(
+                    {
+                        "data": {
+                            "success": True,
+                        }
+                    }
+                ),
+                content_type="application/json",
+            )
+        else:
+            return https_fn.Response(
+                json.dumps(
+                    {
+                        "data": {
+                            "success": False,
+                            "error": "User not found",
+                        }
+                    }
+                ),
+                status=404,
+                content_type="application/json",
+            )
+
+    except Exception as e:
+        print(f"Error handling sign-in: {str(e)}")
+        return https_fn.Response(json.dumps({"error": str(e)}), status=500)
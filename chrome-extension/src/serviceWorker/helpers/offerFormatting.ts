@@ -1,11 +1,29 @@
 import { Offer, OfferToBeFormatted } from '../../types'
 import { formatOffers } from '../firebase/firebaseFunctions'
+import { hashOffer } from './offerHashing'
+
+type UnchangedOffersResult = {
+  offers: Offer[]
+  missingNumbers: string[]
+}
 
 export async function formatOffersInWorker(email: string, offers: OfferToBeFormatted[]): Promise<Offer[]> {
   try {
-    const result = await formatOffers({ email, offers })
+    // Send the hashes first so that only the offers the server doesn't know yet are uploaded
+    const hashes = await Promise.all(
+      offers.map(async (offer) => ({ number: offer.number, hash: await hashOffer(offer) })),
+    )
+    const hashesResult = await formatOffers({ email, hashes })
+    const { offers: unchangedOffers, missingNumbers } = hashesResult.data as UnchangedOffersResult
+
+    if (missingNumbers.length === 0) {
+      return unchangedOffers
+    }
+
+    const missing = new Set(missingNumbers)
+    const result = await formatOffers({ email, offers: offers.filter((offer) => missing.has(offer.number)) })
     const formattedOffers = result.data as Offer[]
-    return formattedOffers
+    return unchangedOffers.concat(formattedOffers)
   } catch (error) {
     console.error('Error in formatOffersInWorker:', error)
     throw error
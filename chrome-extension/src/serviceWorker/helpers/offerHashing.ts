@@ -0,0 +1,33 @@
+import type { OfferToBeFormatted } from '../../types'
+
+// Must produce the same string as json.dumps(offer, sort_keys=True, separators=(",", ":"), ensure_ascii=True)
+// in functions/offer_hash.py so that both sides compute the same hash.
+function canonicalJson(value: unknown): string {
+  if (Array.isArray(value)) {
+    return `[${value.map(canonicalJson).join(',')}]`
+  }
+
+  if (value !== null && typeof value === 'object') {
+    const object = value as Record<string, unknown>
+    const entries = Object.keys(object)
+      .filter((key) => object[key] !== undefined)
+      .sort()
+      .map((key) => `${JSON.stringify(key)}:${canonicalJson(object[key])}`)
+    return `{${entries.join(',')}}`
+  }
+
+  return JSON.stringify(value)
+}
+
+// Like ensure_ascii, DEL (U+007F) is escaped too.
+function escapeNonAscii(json: string): string {
+  return json.replace(/[\u007f-\uffff]/g, (char) => `\\u${char.charCodeAt(0).toString(16).padStart(4, '0')}`)
+}
+
+export async function hashOffer(offer: OfferToBeFormatted): Promise<string> {
+  const data = new TextEncoder().encode(escapeNonAscii(canonicalJson(offer)))
+  const digest = await crypto.subtle.digest('SHA-256', data)
+  return Array.from(new Uint8Array(digest))
+    .map((byte) => byte.toString(16).padStart(2, '0'))
+    .join('')
+}
@@ -1,4 +1,5 @@
 import os
+import sys
 from typing import List
 
 from dotenv import load_dotenv
@@ -8,6 +9,10 @@ from langchain.prompts import PromptTemplate
 from pydantic import BaseModel, Field
 import orjson
 
+# Share the gazetteer of the Cloud Functions.
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "functions"))
+from gazetteer import get_gazetteer  # noqa: E402
+
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
@@ -56,10 +61,10 @@ def clean_locations(locations: list[str]):
     data = parser.parse(output)
     data
 
+    gazetteer = get_gazetteer()
     for value in data.locations.values():
         for location in value:
-            if location.city == "Zürich":
-                location.city = "Zurich"
+            location.city = gazetteer.canonical_city(location.city)
 
     # data.json(indent=2, ensure_ascii=False)
     return orjson.loads(data.json())
@@ -1,26 +1,23 @@
 import json
+import sys
 
+import profiling
 
-def extract_bad_locations(folder_name):
-    with open(folder_name + 'internships.json', 'r') as record:
-        record = json.load(record)
-
-        data = record["data"]
 
-        bad_locations = list_bad_locations(data)
+def extract_bad_locations(folder_name):
+    bad_locations = profiling.distinct_values(
+        folder_name + 'internships.json', 'location')
 
-        print("Number of locations:", len(bad_locations))
+    print("Number of locations:", len(bad_locations))
 
     with open(folder_name + 'bad-locations.json', 'w') as json_file:
         json.dump(bad_locations, json_file, indent=2, ensure_ascii=False)
 
 
 def list_bad_locations(data):
-    locations = []
-    for row in data:
-        if row['location'] not in locations:
-            locations.append(row['location'])
-    return locations
+    return profiling.distinct(data, 'location')
 
 
-extract_bad_locations('data/records/07-03-2023/')
+if __name__ == '__main__':
+    # the snapshot folder can be given as argument
+    extract_bad_locations(sys.argv[1] if len(sys.argv) > 1 else 'data/records/07-03-2023/')
@@ -1,11 +1,12 @@
 import json
+import sys
 
+import profiling
 
-def extract_bad_salaries(folder_name):
-    with open(folder_name + 'scrapped-data.json', 'r') as json_file:
-        data = json.load(json_file)
 
-    bad_salaries = list_bad_locations(data)
+def extract_bad_salaries(folder_name):
+    bad_salaries = profiling.distinct_values(
+        folder_name + 'scrapped-data.json', 'salary')
 
     print("Number of salaries:", len(bad_salaries))
 
@@ -14,12 +15,9 @@ def extract_bad_salaries(folder_name):
 
 
 def list_bad_locations(data):
-    salaries = []
-    for row in data:
-        salary = data[row]['salary']
-        if salary not in salaries:
-            salaries.append(salary)
-    return salaries
+    return profiling.distinct(data.values(), 'salary')
 
 
-extract_bad_salaries('data/records/07-03-2023/')
+if __name__ == '__main__':
+    # the snapshot folder can be given as argument
+    extract_bad_salaries(sys.argv[1] if len(sys.argv) > 1 else 'data/records/07-03-2023/')
@@ -1,7 +1,9 @@
-from internships_from_portalCell import *
-from scrapped_data import *
+import sys
 
-FOLDER = "data/records/07-03-2023/"
+from pipeline import run_pipeline
 
-extract_data_from_html_file(FOLDER)
-add_scrapped_data(FOLDER)
+# the snapshot folder can be given as argument
+FOLDER = sys.argv[1] if len(sys.argv) > 1 else "data/records/07-03-2023/"
+
+# parse the portal dump and add the scrapped data
+run_pipeline(FOLDER, until='enrich')
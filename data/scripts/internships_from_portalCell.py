@@ -1,102 +1,143 @@
-import json
-from bs4 import BeautifulSoup
+import os
+import sys
+from typing import Iterator, List, TypedDict, Union
+
+from lxml import etree
+
+import profiling
+from record_io import dump_record
+
+PORTAL_FILE_NAME = '!PORTAL14S.portalCell'
+
+HEADERS = [
+    "id",
+    "name",
+    "company",
+    "location",
+    "sustainabilityLabel",
+    "number",
+    "format",
+    "registered",
+    "positions",
+    "professor",
+    "creationDate"
+]
+
+FORMATS = {
+    'Stage ou PDM': ['internship', 'project'],
+    'master project or Internship': ['internship', 'project'],
+    'Stage': ['internship'],
+    'Internship': ['internship'],
+    'PDM coordonné': ['project'],
+}
+
+PROFESSORS_TO_FIND = ["à trouver (si PDM)", "To find (if master project)"]
+
+# Size of the pieces of the file given to the parser.
+CHUNK_SIZE = 64 * 1024
+
+# Numbers are converted to ints and empty cells to None.
+Cell = Union[int, str, None]
+
+
+class Internship(TypedDict):
+    id: Cell
+    name: Cell
+    company: Cell
+    location: Cell
+    number: Cell
+    format: Union[List[str], Cell]
+    registered: Cell
+    positions: Cell
+    professor: Cell
+    creationDate: Cell
+
+
+def parse_cell(text):
+    # trim the string, convert it to an int if it contains a number and
+    # replace it with None if it is empty
+    text = text.strip()
+    try:
+        return int(text)
+    except ValueError:
+        return text or None
+
+
+def parse_row(tr) -> Internship:
+    cells = [tr.get('id')]
+    cells.extend(''.join(td.itertext()) for td in tr.iter('td'))
+
+    row = dict(zip(HEADERS, map(parse_cell, cells)))
+
+    # remove the sustainabilityLabel from the dictionary
+    del row['sustainabilityLabel']
+
+    row['format'] = FORMATS.get(row['format'], row['format'])
+
+    if row['professor'] in PROFESSORS_TO_FIND:
+        row['professor'] = None
+
+    return row
+
+
+def iter_internships(file_name) -> Iterator[Internship]:
+    """
+    Parse the rows of the stages table of a portal dump one by one. The file is
+    read in chunks and each row is dropped from the tree once parsed, so the
+    memory used doesn't depend on the size of the dump.
+    """
+    parser = etree.HTMLPullParser(events=('start', 'end'), encoding='utf-8')
+    in_stages = False
+    # the first row contains the headers
+    skip_header = True
+
+    with open(file_name, 'rb') as html_file:
+        while chunk := html_file.read(CHUNK_SIZE):
+            parser.feed(chunk)
+
+            for event, element in parser.read_events():
+                if element.tag == 'stages':
+                    in_stages = event == 'start'
+                    continue
+                if event != 'end' or element.tag != 'tr' or not in_stages:
+                    continue
+
+                if skip_header:
+                    skip_header = False
+                else:
+                    yield parse_row(element)
+
+                element.clear()
+                while element.getprevious() is not None:
+                    del element.getparent()[0]
+
+    parser.close()
+
+
+def snapshot_date(folder_name):
+    # data/records/07-03-2023/ -> 07.03.2023
+    return os.path.basename(os.path.normpath(folder_name)).replace('-', '.')
 
 
 def extract_data_from_html_file(folder_name):
-    file_name = folder_name + '!PORTAL14S.portalCell'
-
-    with open(file_name, 'r') as html_file:
-        content = html_file.read()
-        soup = BeautifulSoup(content)
-        table = soup.find('stages')
-        table_rows = table.find_all('tr')
-
-        headers = [
-            "id",
-            "name",
-            "company",
-            "location",
-            "sustainabilityLabel",
-            "number",
-            "format",
-            "registered",
-            "positions",
-            "professor",
-            "creationDate"
-        ]
-
-        # the rest of the rows are the data
-        data = []
-        for tr in table_rows[1:]:
-            tds = tr.find_all('td')
-            row = [td.text for td in tds]
-            row.insert(0, tr['id'])
-            data.append(row)
-        print("Number of offers available:", len(data))
-        print(data[0])
-
-        # trim the strings at the beginning and the end
-        for row in data:
-            for i in range(len(row)):
-                row[i] = row[i].strip()
-
-        # convert strings to ints only for the columns that contain numbers
-        for row in data:
-            for i in range(len(row)):
-                try:
-                    row[i] = int(row[i])
-                except ValueError:
-                    pass
-
-        # remove the empty strings
-        for row in data:
-            for i in range(len(row)):
-                if row[i] == '':
-                    row[i] = None
-
-        final_data = []
-        for row in data:
-            final_data.append(dict(zip(headers, row)))
-
-        # remove the sustainabilityLabel from the dictionary
-        for row in final_data:
-            del row['sustainabilityLabel']
-
-        # print(list_format_labels(final_data))
-
-        for row in final_data:
-            format = row['format']
-
-            if format == 'Stage ou PDM' or format == 'master project or Internship':
-                row['format'] = ['internship', 'project']
-            elif format == 'Stage' or format == 'Internship':
-                row['format'] = ['internship']
-            elif format == 'PDM coordonné':
-                row['format'] = ['project']
-
-        for row in final_data:
-            professor = row['professor']
-            if professor == "à trouver (si PDM)" or professor == "To find (if master project)":
-                row['professor'] = None
-
-        dataDate = folder_name.split('/')[2].replace('-', '.')
-
-        # create an object with finalData and dataDate
-        final_obj = {
-            "dataDate": dataDate,
-            "data": final_data
-        }
-
-        with open(folder_name + 'internships.json', 'w') as json_file:
-            json.dump(final_obj, json_file, indent=2, ensure_ascii=False)
+    file_name = folder_name + PORTAL_FILE_NAME
+
+    dataDate = snapshot_date(folder_name)
+
+    def rows():
+        for i, row in enumerate(iter_internships(file_name)):
+            if i == 0:
+                print(row)
+            yield row
+
+    count = dump_record(folder_name + 'internships.json', dataDate, rows())
+    print("Number of offers available:", count)
 
 
 def list_format_labels(data):
-    format_labels = []
-    for row in data:
-        if row['format'] not in format_labels:
-            format_labels.append(row['format'])
-    return format_labels
+    return profiling.distinct(data, 'format')
 
 
-extract_data_from_html_file("data/records/07-03-2023/")
+if __name__ == '__main__':
+    # the snapshot folder can be given as argument
+    extract_data_from_html_file(sys.argv[1] if len(sys.argv) > 1 else "data/records/07-03-2023/")
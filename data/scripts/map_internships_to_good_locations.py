@@ -1,4 +1,5 @@
 import json
+import sys
 
 
 def map_bad_locations_to_good_locations(folder_name):
@@ -15,24 +16,29 @@ def map_bad_locations_to_good_locations(folder_name):
 
         # for each internship, map the location to the good location
         for internship in data:
-            bad_location = internship['location']
-            internship['location'] = locations_map_data[bad_location]
+            map_location(internship, locations_map_data)
 
     with open(folder_name + 'internships-with-good-locations.json', 'w') as json_file:
         json.dump(record, json_file,
                   indent=2, ensure_ascii=False)
 
 
+def map_location(internship, locations_map_data):
+    bad_location = internship['location']
+    internship['location'] = locations_map_data[bad_location]
+    return internship
+
+
 def list_countries(locations_map_data):
+    # the cities are kept in dictionaries to find them in constant time
     countries = {}
-    for internship in locations_map_data:
-        locations = locations_map_data[internship]
+    for locations in locations_map_data.values():
         for location in locations:
-            if location['country'] not in countries:
-                countries[location['country']] = []
-            if location['city'] not in countries[location['country']]:
-                countries[location['country']].append(location['city'])
-    return countries
+            cities = countries.setdefault(location['country'], {})
+            cities[location['city']] = None
+    return {country: list(cities) for country, cities in countries.items()}
 
 
-map_bad_locations_to_good_locations('data/records/07-03-2023/')
+if __name__ == '__main__':
+    # the snapshot folder can be given as argument
+    map_bad_locations_to_good_locations(sys.argv[1] if len(sys.argv) > 1 else 'data/records/07-03-2023/')
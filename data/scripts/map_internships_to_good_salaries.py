@@ -1,4 +1,5 @@
 import json
+import sys
 
 
 def map_bad_locations_to_good_locations(folder_name):
@@ -14,17 +15,24 @@ def map_bad_locations_to_good_locations(folder_name):
         data = record['data']
 
         for internship in data:
-            number = internship['number']
-            elem = scrapped_data[f'{number}']
-            bad_salary = elem['salary']
-            if bad_salary is not None:
-                internship['salary'] = salaries_map_data[f'{bad_salary}']
-            else:
-                internship['salary'] = None
+            map_salary(internship, scrapped_data, salaries_map_data)
 
     with open(folder_name + 'internships-with-good-locations-and-salaries.json', 'w') as json_file:
         json.dump(record, json_file,
                   indent=2, ensure_ascii=False)
 
 
-map_bad_locations_to_good_locations('data/records/07-03-2023/')
+def map_salary(internship, scrapped_data, salaries_map_data):
+    number = internship['number']
+    elem = scrapped_data[f'{number}']
+    bad_salary = elem['salary']
+    if bad_salary is not None:
+        internship['salary'] = salaries_map_data[f'{bad_salary}']
+    else:
+        internship['salary'] = None
+    return internship
+
+
+if __name__ == '__main__':
+    # the snapshot folder can be given as argument
+    map_bad_locations_to_good_locations(sys.argv[1] if len(sys.argv) > 1 else 'data/records/07-03-2023/')
@@ -0,0 +1,123 @@
+import argparse
+import contextlib
+import json
+
+from internships_from_portalCell import PORTAL_FILE_NAME, iter_internships, snapshot_date
+from map_internships_to_good_locations import map_location
+from map_internships_to_good_salaries import map_salary
+from record_io import RecordWriter
+from scrapped_data import enrich_row
+
+# Offline pipeline of a snapshot: each offer of the portal dump is parsed, enriched
+# with the scrapped data and mapped to the cleaned location and salary before the
+# next one is read, and the result is written once. The files written by the
+# scripts run one after the other can be written in the same pass as checkpoints.
+
+STAGES = ['parse', 'enrich', 'locations', 'salaries']
+
+OUTPUT_FILE_NAMES = {
+    'parse': 'internships.json',
+    'enrich': 'internships.json',
+    'locations': 'internships-with-good-locations.json',
+    'salaries': 'internships-with-good-locations-and-salaries.json',
+}
+
+INPUT_FILE_NAMES = {
+    'parse': [PORTAL_FILE_NAME],
+    'enrich': ['scrapped-data.json'],
+    'locations': ['bad-to-good-locations.json'],
+    'salaries': ['scrapped-data.json', 'bad-to-good-salaries.json'],
+}
+
+
+def stages_until(until):
+    return STAGES[:STAGES.index(until) + 1]
+
+
+def input_file_names(until):
+    file_names = {}
+    for stage in stages_until(until):
+        file_names.update(dict.fromkeys(INPUT_FILE_NAMES[stage]))
+    return list(file_names)
+
+
+def output_file_names(until, checkpoints=False):
+    """
+    Return the files written by the pipeline with the stages that write them.
+    A file written by several stages is written by the last one.
+    """
+    stages = stages_until(until)
+    if not checkpoints:
+        stages = stages[-1:]
+    return {OUTPUT_FILE_NAMES[stage]: stage for stage in stages}
+
+
+def load_json(file_name):
+    with open(file_name, 'r') as json_file:
+        return json.load(json_file)
+
+
+def run_pipeline(folder_name, until='salaries', checkpoints=False):
+    """
+    Run the stages up to `until` over the offers of a snapshot folder and write
+    the file of the last stage, and those of the earlier stages with checkpoints.
+
+    Returns the number of offers.
+    """
+    stages = stages_until(until)
+    inputs = {
+        file_name: load_json(folder_name + file_name)
+        for file_name in input_file_names(until)
+        if file_name != PORTAL_FILE_NAME
+    }
+
+    steps = []
+    if 'enrich' in stages:
+        scrapped_data = inputs['scrapped-data.json']
+        steps.append(('enrich', lambda row: enrich_row(row, scrapped_data)))
+    if 'locations' in stages:
+        locations_map_data = inputs['bad-to-good-locations.json']
+        steps.append(('locations', lambda row: map_location(row, locations_map_data)))
+    if 'salaries' in stages:
+        scrapped_data = inputs['scrapped-data.json']
+        salaries_map_data = inputs['bad-to-good-salaries.json']
+        steps.append(('salaries', lambda row: map_salary(row, scrapped_data, salaries_map_data)))
+
+    dataDate = snapshot_date(folder_name)
+
+    with contextlib.ExitStack() as stack:
+        writers = {
+            stage: stack.enter_context(RecordWriter(folder_name + file_name, dataDate))
+            for file_name, stage in output_file_names(until, checkpoints).items()
+        }
+
+        count = 0
+        for row in iter_internships(folder_name + PORTAL_FILE_NAME):
+            if 'parse' in writers:
+                writers['parse'].write(row)
+            for stage, step in steps:
+                row = step(row)
+                if stage in writers:
+                    writers[stage].write(row)
+            count += 1
+
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the offline pipeline of a snapshot.")
+    parser.add_argument('folder_name', help="e.g. data/records/07-03-2023/")
+    parser.add_argument('--until', choices=STAGES, default='salaries')
+    parser.add_argument('--checkpoints', action='store_true',
+                        help="Also write the files of the earlier stages.")
+    args = parser.parse_args()
+
+    folder_name = args.folder_name.rstrip('/') + '/'
+    count = run_pipeline(folder_name, args.until, args.checkpoints)
+    print("Number of offers:", count)
+    for file_name in output_file_names(args.until, args.checkpoints):
+        print("Wrote", folder_name + file_name)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+import argparse
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from internships_from_portalCell import PORTAL_FILE_NAME
+from pipeline import STAGES, input_file_names, output_file_names, run_pipeline
+
+# Run the pipeline over every snapshot of data/records in parallel. Like make, a
+# snapshot is skipped when its files are newer than its inputs and than the code
+# of the pipeline, so fixing the parser rebuilds every snapshot.
+
+RECORDS_FOLDER = 'data/records/'
+
+SCRIPTS_FOLDER = os.path.dirname(os.path.abspath(__file__))
+PIPELINE_MODULES = [
+    'internships_from_portalCell.py',
+    'map_internships_to_good_locations.py',
+    'map_internships_to_good_salaries.py',
+    'pipeline.py',
+    'record_io.py',
+    'scrapped_data.py',
+]
+
+
+def discover_snapshots(records_folder):
+    """Return the snapshot folders, the folders containing a portal dump."""
+    file_names = glob.glob(os.path.join(glob.escape(records_folder), '*', PORTAL_FILE_NAME))
+    return sorted(os.path.dirname(file_name) + '/' for file_name in file_names)
+
+
+def last_possible_stage(folder_name, until):
+    """Return the last stage up to `until` whose input files are in the folder."""
+    for stage in reversed(STAGES[:STAGES.index(until) + 1]):
+        if all(os.path.exists(folder_name + file_name) for file_name in input_file_names(stage)):
+            return stage
+    return None
+
+
+def is_up_to_date(folder_name, until, checkpoints):
+    dependencies = [folder_name + file_name for file_name in input_file_names(until)]
+    dependencies += [os.path.join(SCRIPTS_FOLDER, module) for module in PIPELINE_MODULES]
+    newest_input = max(os.path.getmtime(file_name) for file_name in dependencies)
+
+    for file_name in output_file_names(until, checkpoints):
+        output = folder_name + file_name
+        if not os.path.exists(output) or os.path.getmtime(output) <= newest_input:
+            return False
+    return True
+
+
+def process_snapshot(folder_name, until, checkpoints):
+    start = time.perf_counter()
+    count = run_pipeline(folder_name, until, checkpoints)
+    return count, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the offline pipeline of every snapshot.")
+    parser.add_argument('--records', default=RECORDS_FOLDER, help="Folder of the snapshots.")
+    parser.add_argument('--until', choices=STAGES, default='salaries')
+    parser.add_argument('--checkpoints', action='store_true',
+                        help="Also write the files of the earlier stages.")
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(),
+                        help="Number of snapshots processed at the same time.")
+    parser.add_argument('--force', action='store_true', help="Rebuild up-to-date snapshots.")
+    args = parser.parse_args()
+
+    tasks = []
+    for folder_name in discover_snapshots(args.records):
+        until = last_possible_stage(folder_name, args.until)
+        if until is None:
+            print("Skipping", folder_name + ": missing inputs")
+            continue
+        if until != args.until:
+            print("Running", folder_name, "until", until + ": missing inputs for the next stages")
+        if not args.force and is_up_to_date(folder_name, until, args.checkpoints):
+            print("Up to date:", folder_name)
+            continue
+        tasks.append((folder_name, until))
+
+    if not tasks:
+        return
+
+    failures = 0
+    with ProcessPoolExecutor(max_workers=min(args.jobs, len(tasks))) as executor:
+        futures = {
+            executor.submit(process_snapshot, folder_name, until, args.checkpoints): folder_name
+            for folder_name, until in tasks
+        }
+        for future in as_completed(futures):
+            folder_name = futures[future]
+            try:
+                count, elapsed = future.result()
+                print(f"Processed {folder_name}: {count} offers in {elapsed:.2f} seconds")
+            except Exception as e:
+                failures += 1
+                print(f"Error processing {folder_name}: {e!r}")
+
+    if failures:
+        raise SystemExit(f"{failures} snapshot(s) failed")
+
+
+if __name__ == '__main__':
+    main()
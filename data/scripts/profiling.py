@@ -0,0 +1,105 @@
+import json
+import os
+
+# Distinct values and their counts for the fields of a record file, computed in
+# one pass over the rows. The profiles of a snapshot are cached in its folder and
+# the profiles of a file are recomputed only when the file changes.
+
+CACHE_FILE_NAME = 'profile-cache.json'
+
+
+def _key(value):
+    # lists and dicts can't be dictionary keys, they are replaced with tuples and
+    # frozensets, which JSON values never are
+    if isinstance(value, list):
+        return tuple(_key(item) for item in value)
+    if isinstance(value, dict):
+        return frozenset((key, _key(item)) for key, item in value.items())
+    return value
+
+
+def rows_of(content):
+    """
+    Return the rows of a loaded record file: the data of internships.json or the
+    values of scrapped-data.json.
+    """
+    if isinstance(content, dict) and isinstance(content.get('data'), list):
+        return content['data']
+    if isinstance(content, dict):
+        return content.values()
+    return content
+
+
+def profile_rows(rows, fields):
+    """
+    Count the values of each field in one pass over the rows.
+
+    Returns a dictionary with the fields as keys and lists of [value, count]
+    pairs as values, in the order the values are first seen.
+    """
+    counts = {field: {} for field in fields}
+    for row in rows:
+        for field, field_counts in counts.items():
+            value = row[field]
+            key = _key(value)
+            pair = field_counts.get(key)
+            if pair is None:
+                field_counts[key] = [value, 1]
+            else:
+                pair[1] += 1
+    return {field: list(field_counts.values()) for field, field_counts in counts.items()}
+
+
+def distinct(rows, field):
+    """Return the distinct values of a field in the order they are first seen."""
+    return [value for value, _ in profile_rows(rows, [field])[field]]
+
+
+def _signature(file_name):
+    stat = os.stat(file_name)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _load_cache(cache_file_name):
+    try:
+        with open(cache_file_name, 'r') as cache_file:
+            return json.load(cache_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def profile_file(file_name, fields):
+    """
+    Profile fields of a record file, using the cache of its folder. Fields that
+    are not cached yet are computed together in one pass over the file.
+    """
+    folder_name, base_name = os.path.split(file_name)
+    cache_file_name = os.path.join(folder_name, CACHE_FILE_NAME)
+    cache = _load_cache(cache_file_name)
+
+    signature = _signature(file_name)
+    entry = cache.get(base_name)
+    if entry is None or entry['signature'] != signature:
+        entry = {'signature': signature, 'fields': {}}
+
+    missing = [field for field in fields if field not in entry['fields']]
+    if missing:
+        with open(file_name, 'r') as json_file:
+            rows = rows_of(json.load(json_file))
+        entry['fields'].update(profile_rows(rows, missing))
+
+        cache[base_name] = entry
+        with open(cache_file_name, 'w') as cache_file:
+            json.dump(cache, cache_file, ensure_ascii=False)
+
+    return {field: entry['fields'][field] for field in fields}
+
+
+def distinct_values(file_name, field):
+    """Return the distinct values of a field of a record file, using the cache."""
+    return [value for value, _ in profile_file(file_name, [field])[field]]
+
+
+def value_counts(file_name, field):
+    """Return the values of a field of a record file with their number of rows."""
+    return [(value, count) for value, count in profile_file(file_name, [field])[field]]
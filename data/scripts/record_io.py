@@ -0,0 +1,48 @@
+import json
+import os
+
+
+class RecordWriter:
+    """
+    Write a record file row by row. The file is the same as
+    json.dump({"dataDate": data_date, "data": rows}, indent=2, ensure_ascii=False)
+    but the rows don't have to be held in memory. The file is written under a
+    temporary name and only replaces the previous one once complete.
+    """
+
+    def __init__(self, file_name, data_date):
+        self.file_name = file_name
+        self.data_date = data_date
+        self.count = 0
+        self._json_file = None
+
+    def __enter__(self):
+        self._json_file = open(self.file_name + '.tmp', 'w')
+        self._json_file.write('{\n  "dataDate": ')
+        self._json_file.write(json.dumps(self.data_date, ensure_ascii=False))
+        self._json_file.write(',\n  "data": [')
+        return self
+
+    def write(self, row):
+        self._json_file.write(',\n    ' if self.count else '\n    ')
+        row_json = json.dumps(row, indent=2, ensure_ascii=False)
+        self._json_file.write(row_json.replace('\n', '\n    '))
+        self.count += 1
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self._json_file.write('\n  ]\n}' if self.count else ']\n}')
+        self._json_file.close()
+
+        if exc_type is None:
+            os.replace(self.file_name + '.tmp', self.file_name)
+        else:
+            os.remove(self.file_name + '.tmp')
+
+
+def dump_record(file_name, data_date, rows):
+    """Write a record file row by row and return the number of rows written."""
+    with RecordWriter(file_name, data_date) as writer:
+        for row in rows:
+            writer.write(row)
+    return writer.count
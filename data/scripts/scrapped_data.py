@@ -1,4 +1,7 @@
 import json
+import sys
+
+import profiling
 
 
 def add_scrapped_data(folder_name):
@@ -19,16 +22,21 @@ def add_scrapped_data(folder_name):
         data = record["data"]
 
         for row in data:
-            number = row['number']
-            elem = scrapped_data[f'{number}']
-            row['length'] = elem['length']
-            row['hiringTime'] = split_hiringTime(elem['hiringTime'])
-            # row['salary'] = elem['salary']
+            enrich_row(row, scrapped_data)
 
     with open(internships_file_name, 'w') as json_file:
         json.dump(record, json_file, indent=2, ensure_ascii=False)
 
 
+def enrich_row(row, scrapped_data):
+    number = row['number']
+    elem = scrapped_data[f'{number}']
+    row['length'] = elem['length']
+    row['hiringTime'] = split_hiringTime(elem['hiringTime'])
+    # row['salary'] = elem['salary']
+    return row
+
+
 def list_length_labels(scrapped_data):
     return list_labels(scrapped_data, 'length')
 
@@ -38,13 +46,10 @@ def list_hiringTime_labels_without_split(scrapped_data):
 
 
 def list_hiringTime_labels(scrapped_data):
-    labels = []
+    labels = {}
     for label in list_hiringTime_labels_without_split(scrapped_data):
-        hiringTimes = split_hiringTime(label)
-        for hiringTime in hiringTimes:
-            if hiringTime not in labels:
-                labels.append(hiringTime)
-    return labels
+        labels.update(dict.fromkeys(split_hiringTime(label)))
+    return list(labels)
 
 
 def split_hiringTime(hiringTime):
@@ -58,12 +63,9 @@ def list_salary_labels(scrapped_data):
 
 
 def list_labels(scrapped_data, property):
-    labels = []
-    for row in scrapped_data:
-        obj = scrapped_data[row]
-        if obj[property] not in labels:
-            labels.append(obj[property])
-    return labels
+    return profiling.distinct(scrapped_data.values(), property)
 
 
-add_scrapped_data('data/records/07-03-2023/')
+if __name__ == '__main__':
+    # the snapshot folder can be given as argument
+    add_scrapped_data(sys.argv[1] if len(sys.argv) > 1 else 'data/records/07-03-2023/')
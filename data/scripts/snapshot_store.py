@@ -0,0 +1,199 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import typing
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# Share the offer types of the Cloud Functions.
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "..", "functions"))
+from data_types.Offer import Offer  # noqa: E402
+
+from internships_from_portalCell import snapshot_date  # noqa: E402
+
+# Columnar store of the snapshots: the offers of every snapshot are exported to
+# compressed Parquet files partitioned by dataDate, so that an analysis only reads
+# the columns it needs instead of loading every snapshot with json.load.
+
+RECORDS_FOLDER = 'data/records/'
+STORE_FOLDER = 'data/store/'
+SOURCE_FILE_NAME = 'internships-with-good-locations-and-salaries.json'
+PARTITION_FILE_NAME = 'offers.parquet'
+
+# The snapshots name the title of an offer "name".
+RENAMED_COLUMNS = {'name': 'title'}
+
+# Columns cleaned by the pipeline, whose type differs from the raw offers.
+COLUMN_TYPES = {
+    # monthly salary mapped by map_internships_to_good_salaries
+    'salary': pa.float64(),
+    # split by scrapped_data.split_hiringTime
+    'hiringTime': pa.list_(pa.string()),
+}
+
+PARTITIONING = ds.partitioning(pa.schema([('dataDate', pa.string())]), flavor='hive')
+
+
+def arrow_type(annotation):
+    """Return the Arrow type of a type annotation of data_types."""
+    if isinstance(annotation, typing.TypeAliasType):
+        return arrow_type(annotation.__value__)
+
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+    if origin is typing.Union:
+        # Optional[X], the columns are nullable
+        return arrow_type(next(arg for arg in args if arg is not type(None)))
+    if origin is typing.Literal:
+        return pa.string()
+    if origin is list:
+        return pa.list_(arrow_type(args[0]))
+    if typing.is_typeddict(annotation):
+        return pa.struct([
+            pa.field(name, arrow_type(field_type))
+            for name, field_type in typing.get_type_hints(annotation).items()
+        ])
+    return {str: pa.string(), int: pa.int64(), float: pa.float64(), bool: pa.bool_()}[annotation]
+
+
+def offer_schema():
+    """Return the schema of the store, from the Offer and PageData types."""
+    fields = [
+        pa.field(name, COLUMN_TYPES.get(name) or arrow_type(field_type))
+        for name, field_type in typing.get_type_hints(Offer).items()
+    ]
+    return pa.schema(fields)
+
+
+def _to_column(value, column_type):
+    # the pipeline converts every cell that contains a number to an int
+    if value is None:
+        return None
+    if pa.types.is_string(column_type) and not isinstance(value, str):
+        return str(value)
+    if (pa.types.is_integer(column_type) or pa.types.is_floating(column_type)) and isinstance(value, str):
+        try:
+            return float(value) if pa.types.is_floating(column_type) else int(value)
+        except ValueError:
+            return None
+    return value
+
+
+def snapshot_table(rows, schema):
+    columns = {name: [] for name in schema.names}
+    for row in rows:
+        row = {RENAMED_COLUMNS.get(key, key): value for key, value in row.items()}
+        for field in schema:
+            columns[field.name].append(_to_column(row.get(field.name), field.type))
+    return pa.table(columns, schema=schema)
+
+
+def partition_folder(store_folder, data_date):
+    return os.path.join(store_folder, f'dataDate={data_date}')
+
+
+def export_snapshot(folder_name, store_folder=STORE_FOLDER, force=False):
+    """
+    Export a snapshot to the store, unless its partition is newer than the snapshot.
+
+    Returns the number of offers exported, or None if the partition is up to date.
+    """
+    source_file_name = folder_name + SOURCE_FILE_NAME
+    partition_file_name = os.path.join(
+        partition_folder(store_folder, snapshot_date(folder_name)), PARTITION_FILE_NAME)
+    if (not force and os.path.exists(partition_file_name)
+            and os.path.getmtime(partition_file_name) > os.path.getmtime(source_file_name)):
+        return None
+
+    with open(source_file_name, 'r') as json_file:
+        record = json.load(json_file)
+
+    table = snapshot_table(record['data'], offer_schema())
+    os.makedirs(os.path.dirname(partition_file_name), exist_ok=True)
+    pq.write_table(table, partition_file_name + '.tmp', compression='zstd')
+    os.replace(partition_file_name + '.tmp', partition_file_name)
+    return table.num_rows
+
+
+def read_columns(columns, store_folder=STORE_FOLDER, filters=None):
+    """
+    Read some columns of every snapshot of the store. The files are memory-mapped
+    and only the requested columns are read.
+
+    filters are given to pyarrow.parquet.read_table, e.g. [('dataDate', '=', '07.03.2023')].
+    """
+    return pq.read_table(
+        store_folder,
+        columns=columns,
+        filters=filters,
+        partitioning=PARTITIONING,
+        memory_map=True,
+    )
+
+
+def _sort_by_date(table, *sort_keys):
+    # dataDate is day.month.year
+    dates = pc.strptime(table['dataDate'], format='%d.%m.%Y', unit='s')
+    table = table.append_column('date', dates)
+    return table.sort_by([('date', 'ascending'), *sort_keys]).drop_columns(['date'])
+
+
+def salary_over_time(store_folder=STORE_FOLDER):
+    """Return the number of offers with a salary and their mean and median salary in each snapshot."""
+    table = read_columns(['dataDate', 'salary'], store_folder)
+    return _sort_by_date(table.group_by('dataDate').aggregate([
+        ('salary', 'count'),
+        ('salary', 'mean'),
+        ('salary', 'approximate_median'),
+    ]))
+
+
+def countries_per_semester(store_folder=STORE_FOLDER):
+    """Return the number of offers of each country in each snapshot."""
+    table = read_columns(['dataDate', 'location'], store_folder)
+    locations = pc.list_flatten(table['location'])
+    offer_indices = pc.list_parent_indices(table['location'])
+    countries = pa.table({
+        'dataDate': pc.take(table['dataDate'], offer_indices),
+        'country': pc.struct_field(locations, 'country'),
+    })
+    return _sort_by_date(
+        countries.group_by(['dataDate', 'country']).aggregate([('country', 'count')]),
+        ('country_count', 'descending'),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Columnar store of the snapshots.")
+    parser.add_argument('command', choices=['export', 'salaries', 'countries'])
+    parser.add_argument('--records', default=RECORDS_FOLDER, help="Folder of the snapshots.")
+    parser.add_argument('--store', default=STORE_FOLDER, help="Folder of the store.")
+    parser.add_argument('--force', action='store_true', help="Export up-to-date snapshots.")
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        pattern = os.path.join(glob.escape(args.records), '*', SOURCE_FILE_NAME)
+        for file_name in sorted(glob.glob(pattern)):
+            folder_name = os.path.dirname(file_name) + '/'
+            count = export_snapshot(folder_name, args.store, args.force)
+            if count is None:
+                print("Up to date:", folder_name)
+            else:
+                print(f"Exported {folder_name}: {count} offers")
+    else:
+        if args.command == 'salaries':
+            table = salary_over_time(args.store)
+        else:
+            table = countries_per_semester(args.store)
+        print(*table.column_names, sep='\t')
+        for row in table.to_pylist():
+            print(*row.values(), sep='\t')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+import asyncio
+import difflib
+import re
+import unicodedata
+from typing import Any, Awaitable, Callable
+
+from chunk_planner import ChunkPlanner
+
+# Scheduling of the LLM batches of the cleaners. The model sometimes drops a key or
+# rewrites it (e.g. by normalizing its whitespace), so the returned keys are mapped
+# back to the requested ones, the keys that keep failing are retried in smaller
+# chunks and every key has a limited number of attempts.
+
+DEFAULT_CHUNK_SIZE = 50
+MAX_ATTEMPTS_PER_KEY = 3
+
+# Minimum similarity for a returned key to be matched to a requested key.
+FUZZY_MATCH_CUTOFF = 0.9
+
+# Thousands separators, e.g. "4'500".
+_SEPARATOR_PATTERN = re.compile(r"(?<=\d)['’](?=\d)")
+_NUMBER_PATTERN = re.compile(r"\d+")
+
+
+def _normalize_key(key: str) -> str:
+    key = unicodedata.normalize("NFC", key)
+    key = key.replace("’", "'").replace("“", '"').replace("”", '"')
+    return " ".join(key.split()).casefold()
+
+
+def _numbers(key: str) -> list[str]:
+    return _NUMBER_PATTERN.findall(_SEPARATOR_PATTERN.sub("", key))
+
+
+def _similarity(a: str, b: str) -> float:
+    matcher = difflib.SequenceMatcher(None, a, b)
+    if (
+        matcher.real_quick_ratio() < FUZZY_MATCH_CUTOFF
+        or matcher.quick_ratio() < FUZZY_MATCH_CUTOFF
+    ):
+        return 0.0
+    return matcher.ratio()
+
+
+def reconcile_keys(requested: list[str], returned: dict[str, Any]) -> dict[str, Any]:
+    """
+    Map the keys returned by the model back to the requested keys.
+
+    Args: requested (list[str]): The keys sent to the model. returned (dict[str, Any]): The values returned by the model.
+
+    Returns: The values with the requested keys as keys. Requested keys without a match are missing.
+    """
+    values: dict[str, Any] = {}
+    unmatched_returned: dict[str, str] = {}
+    requested_set = set(requested)
+
+    for key, value in returned.items():
+        if key in requested_set:
+            values[key] = value
+        else:
+            unmatched_returned[_normalize_key(key)] = key
+
+    missing = [key for key in requested if key not in values]
+
+    # Keys that only differ by whitespace, case or quotes.
+    for key in list(missing):
+        normalized = _normalize_key(key)
+        if normalized in unmatched_returned:
+            values[key] = returned[unmatched_returned.pop(normalized)]
+            missing.remove(key)
+
+    # Keys that were slightly rewritten, the most similar pairs first. The numbers
+    # must be the same: "3500 CHF" is close to "4500 CHF" but is another value.
+    candidates: list[tuple[float, int, str, str]] = []
+    for i, key in enumerate(missing):
+        normalized = _normalize_key(key)
+        numbers = _numbers(normalized)
+        for returned_normalized in unmatched_returned:
+            score = _similarity(normalized, returned_normalized)
+            if score >= FUZZY_MATCH_CUTOFF and _numbers(returned_normalized) == numbers:
+                candidates.append((score, -i, key, returned_normalized))
+
+    for _, _, key, returned_normalized in sorted(candidates, reverse=True):
+        if key in values or returned_normalized not in unmatched_returned:
+            continue
+        values[key] = returned[unmatched_returned.pop(returned_normalized)]
+
+    return values
+
+
+async def schedule(
+    keys: list[str],
+    predict: Callable[[list[str]], Awaitable[dict[str, Any] | None]],
+    on_resolved: Callable[[dict[str, Any]], Awaitable[None]],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    max_attempts: int = MAX_ATTEMPTS_PER_KEY,
+    planner: ChunkPlanner | None = None,
+) -> list[str]:
+    """
+    Run predict on chunks of keys until every key is resolved or out of attempts.
+    The chunk size of a key is halved each time it is not resolved.
+
+    Args: keys (list[str]): The keys to resolve. predict: Sends a chunk of keys to the model, returns None on error. on_resolved: Called with the values of each chunk as soon as it is done. chunk_size (int): The initial maximum chunk size. max_attempts (int): The number of attempts per key. planner: Packs the keys by tokens within the maximum chunk size, otherwise chunks have the maximum size.
+
+    Returns: The unresolved keys.
+    """
+    attempts = {key: 0 for key in keys}
+    chunk_sizes = {key: chunk_size for key in keys}
+    resolved: set[str] = set()
+
+    async def run_chunk(chunk: list[str]) -> None:
+        returned = await predict(chunk)
+        values = reconcile_keys(chunk, returned or {})
+        resolved.update(values)
+        if values:
+            await on_resolved(values)
+
+        for key in chunk:
+            if key not in values:
+                attempts[key] += 1
+                chunk_sizes[key] = max(1, min(chunk_sizes[key], len(chunk)) // 2)
+
+    pending = list(keys)
+    while pending:
+        # Keys with the same chunk size are batched together.
+        keys_by_size: dict[int, list[str]] = {}
+        for key in pending:
+            keys_by_size.setdefault(chunk_sizes[key], []).append(key)
+
+        chunks: list[list[str]] = []
+        for size, size_keys in keys_by_size.items():
+            if planner is not None:
+                # Off the event loop: the tokenizer is loaded on first use, unless
+                # the runtime was warmed up.
+                chunks.extend(await asyncio.to_thread(planner.pack, size_keys, size))
+            else:
+                chunks.extend(
+                    size_keys[i : i + size] for i in range(0, len(size_keys), size)
+                )
+        await asyncio.gather(*[run_chunk(chunk) for chunk in chunks])
+
+        pending = [
+            key
+            for key in pending
+            if key not in resolved and attempts[key] < max_attempts
+        ]
+
+    return [key for key in keys if key not in resolved]
+
+
+__all__ = [
+    "reconcile_keys",
+    "schedule",
+]
@@ -0,0 +1,264 @@
+import copy
+import threading
+import uuid
+from collections import Counter
+from typing import Any, Iterable
+
+from google.cloud.firestore import DELETE_FIELD, Increment  # type: ignore
+
+# In-memory stand-in for the part of the Firestore client used by the functions.
+# Every operation is counted so that the benchmark can report how many reads and
+# writes a request costs.
+
+MAX_BATCH_SIZE = 500
+
+
+class FakeDocumentSnapshot:
+    def __init__(self, reference: "FakeDocumentReference", data: dict[str, Any] | None):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self) -> dict[str, Any] | None:
+        return copy.deepcopy(self._data)
+
+    def get(self, field: str) -> Any:
+        if self._data is None:
+            raise KeyError(field)
+        return copy.deepcopy(self._data[field])
+
+
+class FakeDocumentReference:
+    def __init__(self, db: "FakeFirestore", collection_name: str, document_id: str):
+        self._db = db
+        self.collection_name = collection_name
+        self.id = document_id
+
+    @property
+    def path(self) -> str:
+        return f"{self.collection_name}/{self.id}"
+
+    def get(self, *args: Any, **kwargs: Any) -> FakeDocumentSnapshot:
+        self._db.count("reads")
+        return self._db.snapshot(self)
+
+    def set(self, data: dict[str, Any], merge: bool = False) -> None:
+        self._db.count("writes")
+        self._db.apply_set(self, data, merge)
+
+    def update(self, data: dict[str, Any]) -> None:
+        self._db.count("writes")
+        self._db.apply_update(self, data)
+
+    def delete(self) -> None:
+        self._db.count("deletes")
+        self._db.apply_delete(self)
+
+    def collection(self, name: str) -> "FakeCollectionReference":
+        return FakeCollectionReference(self._db, f"{self.path}/{name}")
+
+
+class FakeCollectionReference:
+    def __init__(self, db: "FakeFirestore", name: str):
+        self._db = db
+        self.id = name
+
+    def document(self, document_id: str | None = None) -> FakeDocumentReference:
+        return FakeDocumentReference(self._db, self.id, document_id or uuid.uuid4().hex)
+
+    def stream(self) -> Iterable[FakeDocumentSnapshot]:
+        references = [
+            self.document(document_id) for document_id in self._db.ids(self.id)
+        ]
+        self._db.count("reads", len(references))
+        return [self._db.snapshot(reference) for reference in references]
+
+
+class FakeWriteBatch:
+    def __init__(self, db: "FakeFirestore"):
+        self._db = db
+        self._writes: list[tuple[str, FakeDocumentReference, Any, bool]] = []
+
+    def set(
+        self,
+        reference: FakeDocumentReference,
+        data: dict[str, Any],
+        merge: bool = False,
+    ) -> None:
+        self._writes.append(("set", reference, data, merge))
+
+    def update(self, reference: FakeDocumentReference, data: dict[str, Any]) -> None:
+        self._writes.append(("update", reference, data, False))
+
+    def delete(self, reference: FakeDocumentReference) -> None:
+        self._writes.append(("delete", reference, None, False))
+
+    def __len__(self) -> int:
+        return len(self._writes)
+
+    def commit(self) -> list[Any]:
+        # Firestore rejects these, they are reported instead so that the run goes on.
+        if len(self._writes) > MAX_BATCH_SIZE:
+            self._db.count("oversized_batches")
+
+        self._db.count("commits")
+        with self._db.lock:
+            for kind, reference, data, merge in self._writes:
+                if kind == "set":
+                    self._db.count("writes")
+                    self._db.apply_set(reference, data, merge)
+                elif kind == "update":
+                    self._db.count("writes")
+                    self._db.apply_update(reference, data)
+                else:
+                    self._db.count("deletes")
+                    self._db.apply_delete(reference)
+        writes = self._writes
+        self._writes = []
+        return writes
+
+
+class FakeTransaction(FakeWriteBatch):
+    """
+    Implements what google.cloud.firestore.transactional needs. Transactions are
+    serialized with the lock of the database so they are never aborted.
+    """
+
+    _read_only = False
+    _max_attempts = 1
+
+    def __init__(self, db: "FakeFirestore"):
+        super().__init__(db)
+        self._id: bytes | None = None
+
+    def _clean_up(self) -> None:
+        self._writes = []
+        self._id = None
+
+    def _begin(self, retry_id: bytes | None = None) -> None:
+        self._db.lock.acquire()
+        self._db.count("transactions")
+        self._id = uuid.uuid4().bytes
+
+    def _commit(self) -> list[Any]:
+        try:
+            # The lock is reentrant, commit takes it again.
+            return self.commit()
+        finally:
+            self._end()
+
+    def _rollback(self) -> None:
+        self._writes = []
+        self._end()
+
+    def _end(self) -> None:
+        if self._id is not None:
+            self._id = None
+            self._db.lock.release()
+
+    def get_all(
+        self, references: list[FakeDocumentReference], *args: Any, **kwargs: Any
+    ) -> Iterable[FakeDocumentSnapshot]:
+        return self._db.get_all(references)
+
+    def get(self, reference: FakeDocumentReference) -> Iterable[FakeDocumentSnapshot]:
+        return self._db.get_all([reference])
+
+
+class FakeFirestore:
+    def __init__(self):
+        self.collections: dict[str, dict[str, dict[str, Any]]] = {}
+        self.ops: Counter[str] = Counter()
+        self.lock = threading.RLock()
+        self._ops_lock = threading.Lock()
+
+    def count(self, op: str, amount: int = 1) -> None:
+        with self._ops_lock:
+            self.ops[op] += amount
+
+    def reset_counts(self) -> None:
+        with self._ops_lock:
+            self.ops.clear()
+
+    def ids(self, collection_name: str) -> list[str]:
+        with self.lock:
+            return list(self.collections.get(collection_name, {}))
+
+    def collection(self, name: str) -> FakeCollectionReference:
+        return FakeCollectionReference(self, name)
+
+    def document(self, path: str) -> FakeDocumentReference:
+        collection_name, document_id = path.rsplit("/", 1)
+        return FakeDocumentReference(self, collection_name, document_id)
+
+    def batch(self) -> FakeWriteBatch:
+        return FakeWriteBatch(self)
+
+    def transaction(self, **kwargs: Any) -> FakeTransaction:
+        return FakeTransaction(self)
+
+    def get_all(
+        self, references: list[FakeDocumentReference], *args: Any, **kwargs: Any
+    ) -> Iterable[FakeDocumentSnapshot]:
+        self.count("get_all")
+        self.count("reads", len(references))
+        return [self.snapshot(reference) for reference in references]
+
+    def snapshot(self, reference: FakeDocumentReference) -> FakeDocumentSnapshot:
+        with self.lock:
+            data = self.collections.get(reference.collection_name, {}).get(reference.id)
+            return FakeDocumentSnapshot(reference, copy.deepcopy(data))
+
+    def apply_set(
+        self, reference: FakeDocumentReference, data: dict[str, Any], merge: bool
+    ) -> None:
+        with self.lock:
+            documents = self.collections.setdefault(reference.collection_name, {})
+            current = documents.get(reference.id, {}) if merge else {}
+            documents[reference.id] = _merge(current, data)
+
+    def apply_update(
+        self, reference: FakeDocumentReference, data: dict[str, Any]
+    ) -> None:
+        with self.lock:
+            documents = self.collections.setdefault(reference.collection_name, {})
+            if reference.id not in documents:
+                raise KeyError(f"No document to update: {reference.path}")
+            # Unlike set with merge, update replaces the nested maps.
+            document = documents[reference.id]
+            for field_path, value in data.items():
+                *parents, field = field_path.split(".")
+                parent = document
+                for name in parents:
+                    parent = parent.setdefault(name, {})
+                _apply(parent, field, value)
+
+    def apply_delete(self, reference: FakeDocumentReference) -> None:
+        with self.lock:
+            self.collections.get(reference.collection_name, {}).pop(reference.id, None)
+
+
+def _apply(document: dict[str, Any], field: str, value: Any) -> None:
+    if value is DELETE_FIELD:
+        document.pop(field, None)
+    elif isinstance(value, Increment):
+        document[field] = document.get(field, 0) + value.value
+    else:
+        document[field] = copy.deepcopy(value)
+
+
+def _merge(current: dict[str, Any], data: dict[str, Any]) -> dict[str, Any]:
+    merged = copy.deepcopy(current)
+    for key, value in data.items():
+        # set with merge merges the nested maps.
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)  # type: ignore
+        else:
+            _apply(merged, key, value)
+    return merged
+
+
+__all__ = [
+    "FakeFirestore",
+]
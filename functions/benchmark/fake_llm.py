@@ -0,0 +1,199 @@
+import ast
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any
+
+import llm_dispatcher
+from chunk_planner import count_tokens
+
+# Stand-in for the OpenAI model behind llm_dispatcher. Answers come from recorded
+# responses when available and are derived from the input otherwise. Requests take
+# a configurable time and fail at a configurable rate with a retryable error, so
+# the dispatcher's retries and rate limits run as in production.
+
+_NUMBER = re.compile(r"(\d+(?:[.,']\d{3})*(?:\.\d+)?)\s*(k)?", re.IGNORECASE)
+
+
+def synthesize_location(raw: str) -> list[dict[str, str]]:
+    parts = [part.strip() for part in re.split(r"[,;/-]", raw) if part.strip()]
+    if not parts:
+        return [{"city": raw, "country": "Switzerland"}]
+    city = re.sub(r"^\d+\s*", "", parts[0]) or parts[0]
+    country = parts[-1] if len(parts) > 1 else "Switzerland"
+    return [{"city": city, "country": country}]
+
+
+def synthesize_salary(raw: str) -> float | None:
+    values: list[float] = []
+    for number, thousands in _NUMBER.findall(raw):
+        value = float(re.sub(r"[,']", "", number))
+        values.append(value * 1000 if thousands else value)
+    return min(values) if values else None
+
+
+class FakeLLM:
+    def __init__(
+        self,
+        latency: float = 0.8,
+        seconds_per_token: float = 0.005,
+        failure_rate: float = 0.0,
+        recordings: dict[str, dict[str, Any]] | None = None,
+        seed: int = 0,
+    ):
+        self.latency = latency
+        self.seconds_per_token = seconds_per_token
+        self.failure_rate = failure_rate
+        self.recordings = recordings or {}
+        self.random = random.Random(seed)
+
+        self.calls = 0
+        self.failures = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latencies: list[float] = []
+        self._lock = threading.Lock()
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "failures": self.failures,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "latencies": list(self.latencies),
+            }
+
+    def _location(self, raw: str) -> list[dict[str, str]]:
+        return self.recordings.get("locations", {}).get(raw) or synthesize_location(raw)
+
+    def _salary(self, raw: str) -> float | None:
+        salaries = self.recordings.get("salaries", {})
+        return salaries[raw] if raw in salaries else synthesize_salary(raw)
+
+    def answer(self, prompt: str) -> str:
+        if "Format the following offers:\n" in prompt:
+            offers = json.loads(prompt.rsplit("Format the following offers:\n", 1)[1])
+            return json.dumps(
+                {
+                    "offers": [
+                        {
+                            "id": offer["id"],
+                            "locations": (
+                                self._location(offer["location"])
+                                if "location" in offer
+                                else None
+                            ),
+                            "salary": (
+                                self._salary(offer["salary"])
+                                if "salary" in offer
+                                else None
+                            ),
+                        }
+                        for offer in offers
+                    ]
+                }
+            )
+
+        for kind in ("locations", "salaries"):
+            marker = f"Format the following {kind}:\n"
+            if marker in prompt:
+                keys: list[str] = ast.literal_eval(prompt.rsplit(marker, 1)[1].strip())
+                answer = self._location if kind == "locations" else self._salary
+                return json.dumps({kind: {key: answer(key) for key in keys}})
+
+        raise ValueError("Unknown prompt")
+
+    async def run(self, prompt: str) -> tuple[str, int, int]:
+        text = self.answer(prompt)
+        prompt_tokens = count_tokens(prompt)
+        completion_tokens = count_tokens(text)
+
+        with self._lock:
+            self.calls += 1
+            failed = self.random.random() < self.failure_rate
+            jitter = self.random.uniform(0.5, 1.5)
+
+        start = time.perf_counter()
+        await asyncio.sleep(
+            jitter * (self.latency + self.seconds_per_token * completion_tokens)
+        )
+
+        with self._lock:
+            self.prompt_tokens += prompt_tokens
+            if failed:
+                self.failures += 1
+            else:
+                self.completion_tokens += completion_tokens
+                self.latencies.append(time.perf_counter() - start)
+
+        if failed:
+            raise asyncio.TimeoutError()
+        return text, prompt_tokens, completion_tokens
+
+
+class _FakeChatModel:
+    def __init__(self, llm: FakeLLM):
+        self._llm = llm
+
+    async def apredict(self, prompt: str) -> str:
+        text, _, _ = await self._llm.run(prompt)
+        return text
+
+
+class _FakeCompletions:
+    def __init__(self, llm: FakeLLM):
+        self._llm = llm
+
+    async def create(self, messages: list[dict[str, str]], **kwargs: Any) -> Any:
+        text, prompt_tokens, completion_tokens = await self._llm.run(
+            messages[-1]["content"]
+        )
+        return SimpleNamespace(
+            choices=[
+                SimpleNamespace(message=SimpleNamespace(content=text, refusal=None))
+            ],
+            usage=SimpleNamespace(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=prompt_tokens + completion_tokens,
+            ),
+        )
+
+
+def install(llm: FakeLLM, rate_limits: bool = True) -> None:
+    """
+    Route the requests of llm_dispatcher to the fake model.
+
+    Args: llm (FakeLLM): The fake model. rate_limits (bool): Keep the rate limits of the OpenAI account.
+    """
+
+    class FakeLoopState:
+        def __init__(self):
+            self.semaphore = asyncio.Semaphore(llm_dispatcher.MAX_CONCURRENCY)
+            self.async_client = SimpleNamespace(
+                chat=SimpleNamespace(completions=_FakeCompletions(llm))
+            )
+            self._chat_model = _FakeChatModel(llm)
+
+        def get_llm(self, tag: str) -> _FakeChatModel:
+            return self._chat_model
+
+    llm_dispatcher._LoopState = FakeLoopState  # type: ignore
+    llm_dispatcher._loop_states.clear()
+    # Keep the backoff short, the failures are simulated.
+    llm_dispatcher.BASE_BACKOFF = 0.05
+
+    if not rate_limits:
+        llm_dispatcher.requests_bucket = llm_dispatcher.TokenBucket(10**9)
+        llm_dispatcher.tokens_bucket = llm_dispatcher.TokenBucket(10**12)
+
+
+__all__ = [
+    "FakeLLM",
+    "install",
+]
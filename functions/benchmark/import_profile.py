@@ -0,0 +1,162 @@
+"""
+Import-time profile of the functions module.
+
+Imports main in a fresh interpreter with -X importtime, as a new instance does on a
+cold start, and reports the slowest modules. Fails when one of the packages that
+should only be loaded on the first request is imported by main, or when the import
+takes longer than the budget.
+
+Run from the functions folder:
+    python -m benchmark.import_profile --top 20 --budget-ms 1500
+
+The budget and the lazy packages are also checked by tests/test_import_profile.py.
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+from typing import TypedDict
+
+# Packages only needed to send offers to the model.
+LAZY_PACKAGES = [
+    "httpx",
+    "langchain_community",
+    "langchain_core",
+    "openai",
+    "promptlayer",
+    "tiktoken",
+]
+
+# Maximum import time of main, the modules it imports included.
+IMPORT_BUDGET_MS = 1500
+
+IMPORT_MAIN = """
+import sys
+from unittest import mock
+
+with mock.patch("firebase_admin.initialize_app"):
+    import main
+
+print(",".join(sorted(sys.modules)))
+"""
+
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+class ImportTime(TypedDict):
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def parse_importtime(stderr: str) -> list[ImportTime]:
+    """
+    Parse the output of python -X importtime.
+
+    Args: stderr (str): The standard error of the interpreter.
+
+    Returns: The modules in the order their import finished.
+    """
+    imports: list[ImportTime] = []
+    for line in stderr.splitlines():
+        match = _LINE.match(line)
+        if match is None:
+            continue
+        self_us, cumulative_us, indent, module = match.groups()
+        imports.append(
+            {
+                "module": module,
+                "self_us": int(self_us),
+                "cumulative_us": int(cumulative_us),
+                "depth": len(indent) // 2,
+            }
+        )
+    return imports
+
+
+def profile_main() -> tuple[list[ImportTime], set[str]]:
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "offline"),
+        "LEMON_SQUEEZY_SIGNING_SECRET": os.getenv(
+            "LEMON_SQUEEZY_SIGNING_SECRET", "offline"
+        ),
+    }
+    # A deployed instance would start warming up its clients in the background.
+    env.pop("K_SERVICE", None)
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", IMPORT_MAIN],
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing main failed:\n{result.stderr[-2000:]}")
+
+    modules = set(result.stdout.strip().splitlines()[-1].split(","))
+    return parse_importtime(result.stderr), modules
+
+
+def main_import_ms(imports: list[ImportTime]) -> float:
+    """Return the import time of main in milliseconds."""
+    main_us = next(
+        (entry["cumulative_us"] for entry in imports if entry["module"] == "main"), 0
+    )
+    return main_us / 1000
+
+
+def lazy_packages_loaded(modules: set[str]) -> list[str]:
+    """Return the packages that main imports but should only load on first use."""
+    return [package for package in LAZY_PACKAGES if package in modules]
+
+
+def main_profile() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=IMPORT_BUDGET_MS,
+        help="Maximum import time of main.",
+    )
+    args = parser.parse_args()
+
+    imports, modules = profile_main()
+    total_us = sum(entry["cumulative_us"] for entry in imports if entry["depth"] == 0)
+    main_ms = main_import_ms(imports)
+
+    print(f"Import of main: {main_ms:.0f} ms ({total_us / 1000:.0f} ms total)")
+    print()
+    header = f"{'cumulative (ms)':>15} {'self (ms)':>10}  module"
+    print(header)
+    print("-" * len(header))
+    slowest = sorted(imports, key=lambda entry: entry["cumulative_us"], reverse=True)
+    for entry in slowest[: args.top]:
+        print(
+            f"{entry['cumulative_us'] / 1000:>15.1f} {entry['self_us'] / 1000:>10.1f}  "
+            f"{'  ' * entry['depth']}{entry['module']}"
+        )
+
+    failures: list[str] = []
+    loaded = lazy_packages_loaded(modules)
+    if loaded:
+        failures.append(f"Imported by main but should be lazy: {', '.join(loaded)}")
+    if main_ms > args.budget_ms:
+        failures.append(
+            f"Import of main took {main_ms:.0f} ms, over the budget of {args.budget_ms:g} ms"
+        )
+
+    print()
+    for failure in failures:
+        print(failure)
+    if failures:
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main_profile()
@@ -0,0 +1,295 @@
+"""
+Offline benchmark of the formatting pipeline.
+
+Drives format_offers (or the two cleaners directly) against an in-memory Firestore
+and a fake model, for synthetic listings of several sizes, and reports the latency
+percentiles, the Firestore operations and the tokens per offer.
+
+Run from the functions folder:
+    python -m benchmark.run --sizes 100 1000 10000 --trials 3
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import math
+import os
+import time
+from collections import Counter
+from typing import Any
+from unittest import mock
+
+# main reads its secrets and initializes the Firebase app on import.
+os.environ.setdefault("OPENAI_API_KEY", "offline")
+os.environ.setdefault("LEMON_SQUEEZY_SIGNING_SECRET", "offline")
+
+with mock.patch("firebase_admin.initialize_app"):
+    import main
+
+import bulk_writer
+import flask
+from clean_bad_locations_openai import clean_locations, locations_cache
+from clean_salaries_openai import clean_salaries, salaries_cache
+from job_queue import InMemoryJobQueue
+
+from benchmark.fake_firestore import FakeFirestore
+from benchmark.fake_llm import (
+    FakeLLM,
+    install,
+    synthesize_location,
+    synthesize_salary,
+)
+from benchmark.synthetic_offers import generate_offers
+
+EMAIL = "benchmark@epfl.ch"
+
+app = flask.Flask("benchmark")
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def reset_caches(
+    db: FakeFirestore, offers: list[dict[str, Any]], cache_hit_rate: float
+) -> None:
+    """Empty the in-memory caches and store a share of the strings in Firestore."""
+    for cache in (locations_cache, salaries_cache):
+        cache._memory.clear()  # type: ignore
+
+    for cache, field in ((locations_cache, "location"), (salaries_cache, "salary")):
+        raws = list(dict.fromkeys(offer[field] for offer in offers))
+        cached = raws[: int(len(raws) * cache_hit_rate)]
+        if field == "location":
+            values = {raw: synthesize_location(raw) for raw in cached}
+        else:
+            values = {raw: synthesize_salary(raw) for raw in cached}
+        cache.set_many(db, values)  # type: ignore
+        cache._memory.clear()  # type: ignore
+
+
+def post_format_offers(db: FakeFirestore, data: dict[str, Any]) -> bytes:
+    with app.test_request_context(method="POST", json={"data": data}):
+        response = main.format_offers(flask.request)
+        # Streamed responses are only produced when they are read.
+        body = response.get_data()
+    if response.status_code != 200:
+        raise RuntimeError(f"format_offers failed: {body[:200]!r}")
+
+    if data.get("background"):
+        main.job_queue.run_pending(db, main.run_format_job)  # type: ignore
+
+    return body
+
+
+def run_cleaners(db: FakeFirestore, offers: list[dict[str, Any]]) -> None:
+    async def clean() -> None:
+        await asyncio.gather(
+            clean_locations([offer["location"] for offer in offers], db),  # type: ignore
+            clean_salaries([offer["salary"] for offer in offers], db),  # type: ignore
+        )
+
+    asyncio.run(clean())
+
+
+def measure(
+    db: FakeFirestore, llm: FakeLLM, run: Any, num_offers: int, verbose: bool
+) -> dict[str, Any]:
+    db.reset_counts()
+    before = llm.snapshot()
+    start = time.perf_counter()
+    # The pipeline logs every request.
+    with (
+        contextlib.nullcontext()
+        if verbose
+        else contextlib.redirect_stdout(io.StringIO())
+    ):
+        run()
+    elapsed = time.perf_counter() - start
+    # The writes committed after the response belong to this run.
+    bulk_writer.flush()
+    after = llm.snapshot()
+
+    tokens = (
+        after["prompt_tokens"]
+        + after["completion_tokens"]
+        - before["prompt_tokens"]
+        - before["completion_tokens"]
+    )
+    return {
+        "elapsed": elapsed,
+        "ops": Counter(db.ops),
+        "llm_calls": after["calls"] - before["calls"],
+        "llm_failures": after["failures"] - before["failures"],
+        "llm_latencies": after["latencies"][len(before["latencies"]) :],
+        "tokens_per_offer": tokens / num_offers,
+    }
+
+
+def summarize(scenario: str, size: int, runs: list[dict[str, Any]]) -> dict[str, Any]:
+    elapsed = [run["elapsed"] for run in runs]
+    llm_latencies = [latency for run in runs for latency in run["llm_latencies"]]
+    ops: Counter[str] = Counter()
+    for run in runs:
+        ops.update(run["ops"])
+
+    return {
+        "scenario": scenario,
+        "offers": size,
+        "trials": len(runs),
+        "p50": percentile(elapsed, 50),
+        "p99": percentile(elapsed, 99),
+        "llm_p50": percentile(llm_latencies, 50),
+        "llm_p99": percentile(llm_latencies, 99),
+        "llm_calls": sum(run["llm_calls"] for run in runs) / len(runs),
+        "llm_failures": sum(run["llm_failures"] for run in runs) / len(runs),
+        "tokens_per_offer": sum(run["tokens_per_offer"] for run in runs) / len(runs),
+        "firestore_ops": {op: count / len(runs) for op, count in sorted(ops.items())},
+    }
+
+
+def print_report(results: list[dict[str, Any]]) -> None:
+    header = (
+        f"{'scenario':<10} {'offers':>7} {'p50 (s)':>8} {'p99 (s)':>8} "
+        f"{'llm p50':>8} {'llm p99':>8} {'calls':>6} {'fails':>6} "
+        f"{'tok/offer':>9}  firestore ops (per trial)"
+    )
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        ops = ", ".join(
+            f"{op}={count:g}" for op, count in result["firestore_ops"].items()
+        )
+        print(
+            f"{result['scenario']:<10} {result['offers']:>7} "
+            f"{result['p50']:>8.2f} {result['p99']:>8.2f} "
+            f"{result['llm_p50']:>8.2f} {result['llm_p99']:>8.2f} "
+            f"{result['llm_calls']:>6g} {result['llm_failures']:>6g} "
+            f"{result['tokens_per_offer']:>9.1f}  {ops}"
+        )
+
+
+def main_benchmark() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--trials", type=int, default=3)
+    parser.add_argument(
+        "--target", choices=["format_offers", "cleaners"], default="format_offers"
+    )
+    parser.add_argument(
+        "--mode", choices=["sync", "stream", "background"], default="sync"
+    )
+    parser.add_argument("--hashes", action="store_true", help="Send the hashes first.")
+    parser.add_argument("--latency", type=float, default=0.8)
+    parser.add_argument("--seconds-per-token", type=float, default=0.005)
+    parser.add_argument("--failure-rate", type=float, default=0.02)
+    parser.add_argument("--cache-hit-rate", type=float, default=0.0)
+    parser.add_argument("--recordings", help="JSON file of recorded model answers.")
+    parser.add_argument("--no-rate-limits", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Also write the results to this file.")
+    parser.add_argument("--verbose", action="store_true", help="Show the logs.")
+    args = parser.parse_args()
+
+    recordings = None
+    if args.recordings:
+        with open(args.recordings, "r") as json_file:
+            recordings = json.load(json_file)
+
+    llm = FakeLLM(
+        latency=args.latency,
+        seconds_per_token=args.seconds_per_token,
+        failure_rate=args.failure_rate,
+        recordings=recordings,
+        seed=args.seed,
+    )
+    install(llm, rate_limits=not args.no_rate_limits)
+    main.job_queue = InMemoryJobQueue()
+
+    results: list[dict[str, Any]] = []
+
+    for size in args.sizes:
+        cold_runs: list[dict[str, Any]] = []
+        warm_runs: list[dict[str, Any]] = []
+
+        for trial in range(args.trials):
+            db = FakeFirestore()
+            main.get_db = lambda: db  # type: ignore
+            offers: list[dict[str, Any]] = generate_offers(size, seed=args.seed + trial)  # type: ignore
+            reset_caches(db, offers, args.cache_hit_rate)
+
+            if args.target == "cleaners":
+                cold_runs.append(
+                    measure(
+                        db, llm, lambda: run_cleaners(db, offers), size, args.verbose
+                    )
+                )
+                # The second run is served by the in-memory caches.
+                warm_runs.append(
+                    measure(
+                        db, llm, lambda: run_cleaners(db, offers), size, args.verbose
+                    )
+                )
+                continue
+
+            data: dict[str, Any] = {
+                "email": EMAIL,
+                "offers": offers,
+                "background": args.mode == "background",
+                "stream": args.mode == "stream",
+            }
+
+            def send() -> None:
+                if not args.hashes:
+                    post_format_offers(db, data)
+                    return
+
+                # Like the extension: the hashes first, then the missing offers.
+                body = post_format_offers(
+                    db,
+                    {
+                        "email": EMAIL,
+                        "hashes": [
+                            {
+                                "number": offer["number"],
+                                "hash": main.compute_offer_hash(offer),  # type: ignore
+                            }
+                            for offer in offers
+                        ],
+                    },
+                )
+                missing_numbers = set(json.loads(body)["data"]["missingNumbers"])
+                if missing_numbers:
+                    post_format_offers(
+                        db,
+                        {
+                            **data,
+                            "offers": [
+                                offer
+                                for offer in offers
+                                if offer["number"] in missing_numbers
+                            ],
+                        },
+                    )
+
+            cold_runs.append(measure(db, llm, send, size, args.verbose))
+            # Same listing again: every offer is unchanged.
+            warm_runs.append(measure(db, llm, send, size, args.verbose))
+
+        results.append(summarize("cold", size, cold_runs))
+        results.append(summarize("warm", size, warm_runs))
+
+    print_report(results)
+
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(results, json_file, indent=2)
+
+
+if __name__ == "__main__":
+    main_benchmark()
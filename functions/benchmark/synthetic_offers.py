@@ -0,0 +1,136 @@
+import json
+import os
+import random
+
+from data_types.Offer import OfferToFormat
+
+# Synthetic ISA listings. Like the real portal, many offers share a location or a
+# salary text. Part of the strings are resolved locally (gazetteer, salary rules),
+# the others need the model.
+
+GAZETTEER_PATH = os.path.join(os.path.dirname(__file__), "..", "gazetteer.json")
+
+# Share of distinct location and salary texts among the offers.
+DEFAULT_DISTINCT_RATIO = 0.3
+# Share of the distinct texts that can be resolved without the model.
+DEFAULT_LOCAL_RATIO = 0.6
+
+
+def _known_locations() -> list[str]:
+    with open(GAZETTEER_PATH, "r") as json_file:
+        gazetteer = json.load(json_file)
+
+    return [
+        template.format(city=city, country=country)
+        for country, cities in gazetteer["cities"].items()
+        for city in cities
+        for template in ("{city}", "{city}, {country}", "1000 {city} ({country})")
+    ]
+
+
+def _location_pool(size: int, local_ratio: float, rng: random.Random) -> list[str]:
+    known = _known_locations()
+    rng.shuffle(known)
+    num_known = min(len(known), int(size * local_ratio))
+    unknown = [
+        rng.choice(
+            [
+                f"Research Site {i}, Canton {i % 26}, Switzerland",
+                f"Campus {i} - Remote possible",
+                f"Headquarters {i} and branch offices (Country {i % 40})",
+            ]
+        )
+        for i in range(size - num_known)
+    ]
+    return known[:num_known] + unknown
+
+
+def _salary_pool(size: int, local_ratio: float, rng: random.Random) -> list[str]:
+    num_known = int(size * local_ratio)
+    known = [
+        rng.choice(
+            [
+                f"{2000 + 10 * i} CHF/month",
+                f"CHF {2000 + 10 * i}.- brut par mois",
+                f"{2000 + 10 * i} CHF per month (gross)",
+            ]
+        )
+        for i in range(num_known)
+    ]
+    unknown = [
+        rng.choice(
+            [
+                f"Bachelor: {1500 + i} CHF, Master: {2500 + i} CHF",
+                f"Between {2 + i % 3}k and {3 + i % 3}k depending on the profile ({i})",
+                f"To be discussed during the interview #{i}",
+            ]
+        )
+        for i in range(size - num_known)
+    ]
+    return known + unknown
+
+
+def generate_offers(
+    n: int,
+    seed: int = 0,
+    distinct_ratio: float = DEFAULT_DISTINCT_RATIO,
+    local_ratio: float = DEFAULT_LOCAL_RATIO,
+) -> list[OfferToFormat]:
+    """
+    Generate a listing of offers as sent by the extension.
+
+    Args: n (int): The number of offers. seed (int): The seed of the generator. distinct_ratio (float): The share of distinct location and salary texts. local_ratio (float): The share of distinct texts resolved without the model.
+
+    Returns: The offers.
+    """
+    rng = random.Random(seed)
+    pool_size = max(1, int(n * distinct_ratio))
+    locations = _location_pool(pool_size, local_ratio, rng)
+    salaries = _salary_pool(pool_size, local_ratio, rng)
+
+    offers: list[OfferToFormat] = []
+    for i in range(n):
+        number = f"{seed}-{i:06d}"
+        offers.append(
+            OfferToFormat(
+                id=str(1_000_000 + i),
+                title=f"Internship {i}",
+                company=f"Company {i % 500}",
+                location=rng.choice(locations),
+                salary=rng.choice(salaries),
+                number=number,
+                format=[rng.choice(["internship", "project"])],
+                registered=rng.randint(0, 20),
+                positions=rng.randint(1, 3),
+                professor=None,
+                creationDate="01.09.2024",
+                length=rng.choice(["4 - 6 mois", "6 mois", "Internship 6 months"]),
+                hiringTime="Printemps",
+                benefits="",
+                description=f"Description of the internship {i}. " * 5,
+                requiredSkills="Python",
+                remarks="",
+                languages={"french": "", "english": "Good", "german": ""},
+                relatedMasters=["Computer Science"],
+                companyInfo={
+                    "name": f"Company {i % 500}",
+                    "address": {"street": "", "city": "", "country": ""},
+                    "website": "",
+                },
+                contactInfo={
+                    "name": "",
+                    "title": "",
+                    "email": "",
+                    "cellPhone": "",
+                    "professionalPhone": "",
+                },
+                file=None,
+            )
+        )
+
+    return offers
+
+
+__all__ = [
+    "generate_offers",
+]
@@ -0,0 +1,148 @@
+# pyright: reportUnknownMemberType=false
+import contextvars
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Literal
+
+import google.cloud.firestore  # type: ignore
+from google.api_core import exceptions  # type: ignore
+
+# Writes of many documents at once. A Firestore batch holds at most 500 writes, so
+# the writes are split into batches that are committed in parallel. A batch whose
+# commit fails with a transient error is committed again: the writes are sets and
+# deletes, which give the same result when applied twice.
+
+MAX_BATCH_SIZE = 500
+MAX_WORKERS = 8
+MAX_ATTEMPTS = 5
+BASE_BACKOFF = 0.5
+
+RETRYABLE_ERRORS = (
+    exceptions.Aborted,
+    exceptions.DeadlineExceeded,
+    exceptions.InternalServerError,
+    exceptions.ResourceExhausted,
+    exceptions.ServiceUnavailable,
+)
+
+# Commits that are not awaited by the request, see BulkWriter.commit_later.
+_background = ThreadPoolExecutor(max_workers=2, thread_name_prefix="bulk-writer")
+_pending: set["Future[int]"] = set()
+_pending_lock = threading.Lock()
+
+Write = tuple[
+    Literal["set", "delete"],
+    google.cloud.firestore.DocumentReference,
+    dict[str, Any] | None,
+    bool,
+]
+
+
+class BulkWriter:
+    def __init__(self, db: google.cloud.firestore.Client):
+        self._db = db
+        self._writes: list[Write] = []
+
+    def set(
+        self,
+        reference: google.cloud.firestore.DocumentReference,
+        data: dict[str, Any],
+        merge: bool = False,
+    ) -> None:
+        self._writes.append(("set", reference, data, merge))
+
+    def delete(self, reference: google.cloud.firestore.DocumentReference) -> None:
+        self._writes.append(("delete", reference, None, False))
+
+    def __len__(self) -> int:
+        return len(self._writes)
+
+    def _commit_batch(self, writes: list[Write]) -> None:
+        for attempt in range(MAX_ATTEMPTS):
+            batch = self._db.batch()
+            for kind, reference, data, merge in writes:
+                if kind == "set":
+                    batch.set(reference, data, merge=merge)
+                else:
+                    batch.delete(reference)
+
+            try:
+                batch.commit()
+                return
+            except RETRYABLE_ERRORS as e:
+                if attempt == MAX_ATTEMPTS - 1:
+                    raise
+                delay = random.uniform(0, BASE_BACKOFF * 2**attempt)
+                print(
+                    f"Batch commit failed ({type(e).__name__}), retrying in {delay:0.2f} seconds."
+                )
+                time.sleep(delay)
+
+    def commit(self) -> int:
+        """
+        Commit the writes in batches of at most 500 writes, in parallel.
+
+        Returns: The number of batches.
+        """
+        writes, self._writes = self._writes, []
+        batches = [
+            writes[i : i + MAX_BATCH_SIZE]
+            for i in range(0, len(writes), MAX_BATCH_SIZE)
+        ]
+
+        if len(batches) <= 1:
+            for batch in batches:
+                self._commit_batch(batch)
+            return len(batches)
+
+        with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(batches))) as pool:
+            # Raises the first error once every batch is done.
+            for future in [pool.submit(self._commit_batch, b) for b in batches]:
+                future.result()
+        return len(batches)
+
+    def commit_later(self) -> "Future[int]":
+        """
+        Commit the writes in a background thread, e.g. after the response is
+        returned. Errors are printed.
+
+        Cloud Run throttles the CPU of an instance once the response is returned,
+        unless the service has CPU always allocated: the commit can then stall
+        until the next request, or be lost if the instance is shut down. Only
+        writes that the response doesn't depend on should be committed later.
+
+        Returns: The future of the commit.
+        """
+        writer = BulkWriter(self._db)
+        writer._writes, self._writes = self._writes, []
+
+        context = contextvars.copy_context()
+        future = _background.submit(context.run, writer.commit)
+        with _pending_lock:
+            _pending.add(future)
+        future.add_done_callback(_on_done)
+        return future
+
+
+def _on_done(future: "Future[int]") -> None:
+    with _pending_lock:
+        _pending.discard(future)
+    error = future.exception()
+    if error is not None:
+        print(f"Error committing the writes: {error}")
+
+
+def flush(timeout: float | None = None) -> None:
+    """Wait for the commits started by commit_later."""
+    with _pending_lock:
+        pending = list(_pending)
+    wait(pending, timeout)
+
+
+__all__ = [
+    "MAX_BATCH_SIZE",
+    "BulkWriter",
+    "flush",
+]
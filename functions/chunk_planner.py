@@ -0,0 +1,177 @@
+import heapq
+import json
+import math
+import threading
+from functools import lru_cache
+from typing import Callable
+
+from llm_dispatcher import MAX_CONCURRENCY, MAX_TOKENS, MODEL
+
+# Token-aware packing of the keys sent to the model. The chunks are filled up to an
+# output budget estimated from the output/input ratio of the previous requests, and
+# sized from the observed latency so that the chunks running under asyncio.gather
+# finish at about the same time.
+
+# Part of max_tokens the estimated output can use, the rest is a safety margin
+# against truncated JSON.
+OUTPUT_BUDGET_RATIO = 0.75
+# Tokens of the keys of a chunk, the instructions come on top.
+INPUT_BUDGET = 8000
+MAX_CHUNK_SIZE = 200
+
+# Weight of a new observation in the moving averages.
+SMOOTHING = 0.2
+
+# Latency model before any observation: a fixed overhead per request plus a time
+# per output token.
+DEFAULT_OVERHEAD_SECONDS = 1.0
+DEFAULT_SECONDS_PER_TOKEN = 0.01
+
+
+@lru_cache(maxsize=1)
+def _get_encoder() -> Callable[[str], list[int]] | None:
+    try:
+        import tiktoken
+
+        return tiktoken.encoding_for_model(MODEL).encode
+    except Exception as e:
+        # The encoding is downloaded on first use.
+        print("The tokenizer is not available, falling back to an estimate:", e)
+        return None
+
+
+def warm_up() -> None:
+    """
+    Load the tokenizer ahead of the first request. Loading it can download the
+    encoding, which must not happen on the event loop shared by the requests.
+    """
+    _get_encoder()
+
+
+def count_tokens(text: str) -> int:
+    encode = _get_encoder()
+    if encode is None:
+        return math.ceil(len(text) / 4)
+    return len(encode(text))
+
+
+class ChunkPlanner:
+    """
+    Plans the chunks of keys of one kind of request (e.g. the locations).
+    Shared by the requests handled by a warm instance so that the ratios and the
+    latency model improve over time.
+    """
+
+    def __init__(self, initial_output_ratio: float):
+        self.output_ratio = initial_output_ratio
+        self.output_budget = int(MAX_TOKENS * OUTPUT_BUDGET_RATIO)
+        self.input_budget = INPUT_BUDGET
+
+        # Exponentially weighted statistics of (output tokens, seconds) used to fit
+        # seconds = overhead + seconds_per_token * output tokens.
+        self._mean_tokens = 0.0
+        self._mean_seconds = 0.0
+        self._var_tokens = 0.0
+        self._cov = 0.0
+        self._observations = 0
+        self.overhead_seconds = DEFAULT_OVERHEAD_SECONDS
+        self.seconds_per_token = DEFAULT_SECONDS_PER_TOKEN
+
+        self._lock = threading.Lock()
+
+    def input_tokens(self, key: str) -> int:
+        # The keys are sent as a JSON list.
+        return count_tokens(json.dumps(key, ensure_ascii=False)) + 1
+
+    def target_output_tokens(self, total_output_tokens: float) -> float:
+        """
+        Output tokens per chunk minimizing the wall time: the work is spread over
+        the concurrent requests, but a chunk stays large enough for the fixed
+        overhead not to dominate and small enough to fit in the output budget.
+        """
+        spread = total_output_tokens / MAX_CONCURRENCY
+        worthwhile = self.overhead_seconds / self.seconds_per_token
+        return min(self.output_budget, max(spread, worthwhile))
+
+    def pack(self, keys: list[str], max_keys: int = MAX_CHUNK_SIZE) -> list[list[str]]:
+        """
+        Split the keys into chunks of similar estimated output size.
+
+        Args: keys (list[str]): The keys to send to the model. max_keys (int): The maximum number of keys per chunk.
+
+        Returns: The chunks of keys.
+        """
+        if not keys:
+            return []
+
+        input_tokens = {key: self.input_tokens(key) for key in keys}
+        output_tokens = {
+            key: tokens * self.output_ratio for key, tokens in input_tokens.items()
+        }
+        total_output = sum(output_tokens.values())
+        largest = max(output_tokens.values())
+
+        # Balancing can put the largest key on top of an average chunk.
+        target = min(
+            self.target_output_tokens(total_output),
+            max(self.output_budget - largest, largest),
+        )
+        num_chunks = max(
+            math.ceil(total_output / target),
+            math.ceil(sum(input_tokens.values()) / self.input_budget),
+            math.ceil(len(keys) / max(1, max_keys)),
+        )
+
+        # Longest keys first, each one in the least loaded chunk that isn't full.
+        chunks: list[list[str]] = [[] for _ in range(num_chunks)]
+        heap = [(0.0, i) for i in range(num_chunks)]
+        for key in sorted(keys, key=lambda key: output_tokens[key], reverse=True):
+            load, i = heapq.heappop(heap)
+            chunks[i].append(key)
+            if len(chunks[i]) < max_keys:
+                heapq.heappush(heap, (load + output_tokens[key], i))
+
+        return [chunk for chunk in chunks if chunk]
+
+    def observe(self, keys: list[str], output: str, elapsed: float) -> None:
+        """
+        Update the output ratio and the latency model with a finished request.
+
+        Args: keys (list[str]): The keys of the chunk. output (str): The output of the model. elapsed (float): The duration of the request in seconds.
+        """
+        input_tokens = sum(self.input_tokens(key) for key in keys)
+        output_tokens = count_tokens(output)
+        if input_tokens == 0 or output_tokens == 0:
+            return
+
+        with self._lock:
+            self.output_ratio += SMOOTHING * (
+                output_tokens / input_tokens - self.output_ratio
+            )
+
+            self._observations += 1
+            weight = 1.0 if self._observations == 1 else SMOOTHING
+            delta_tokens = output_tokens - self._mean_tokens
+            delta_seconds = elapsed - self._mean_seconds
+            self._mean_tokens += weight * delta_tokens
+            self._mean_seconds += weight * delta_seconds
+            self._var_tokens = (1 - weight) * (
+                self._var_tokens + weight * delta_tokens**2
+            )
+            self._cov = (1 - weight) * (
+                self._cov + weight * delta_tokens * delta_seconds
+            )
+
+            # Needs requests of different sizes to separate the two terms.
+            if self._var_tokens > 1 and self._cov > 0:
+                self.seconds_per_token = self._cov / self._var_tokens
+                self.overhead_seconds = max(
+                    0.0, self._mean_seconds - self.seconds_per_token * self._mean_tokens
+                )
+
+
+__all__ = [
+    "ChunkPlanner",
+    "count_tokens",
+    "warm_up",
+]
@@ -1,20 +1,21 @@
 import asyncio
-import os
 import time
-
-from dotenv import load_dotenv
-from langchain_community.callbacks import (
-    get_openai_callback,
-)
-from langchain_community.chat_models import PromptLayerChatOpenAI
-from langchain_core.output_parsers import PydanticOutputParser
-from langchain_core.prompts import PromptTemplate
-from locations_types import LocationDict
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Callable
+
+import google.cloud.firestore  # type: ignore
+import tracing
+from batch_scheduler import schedule
+from chunk_planner import MAX_CHUNK_SIZE, ChunkPlanner
+from gazetteer import resolve_locations
+from llm_dispatcher import complete
+from locations_types import Location, LocationDict
+from normalization_cache import NormalizationCache
 from pydantic import ValidationError
+from single_flight import coalesce
 
-load_dotenv()
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-
+if TYPE_CHECKING:
+    from langchain_core.output_parsers import PydanticOutputParser
 
 # location_query = "Extract the city and the country from a location in a json format."
 location_query = """I have a list of text describing locations.
@@ -25,35 +26,58 @@ Countries should not be acronyms: for example "USA" should be change to "United
 EPFL is refering to "Lausanne".
 """
 
-parser = PydanticOutputParser(pydantic_object=LocationDict)
+# Bump when the prompt changes so that previously cached answers are not reused.
+PROMPT_VERSION = "1"
 
-prompt = PromptTemplate(
-    template="Answer the user query.\n{format_instructions}\n{query}\nFormat the following locations:\n{locations}\n",
-    input_variables=["locations"],
-    partial_variables={
-        "format_instructions": parser.get_format_instructions(),
-        "query": location_query,
-    },
-)
+locations_cache = NormalizationCache("locations_cache", PROMPT_VERSION)
 
+# Each location is repeated in the output with its cities and countries.
+locations_planner = ChunkPlanner(initial_output_ratio=3.0)
 
-async def clean_locations(locations: list[str]) -> LocationDict:
-    """
-    Clean a list of locations using OpenAI.
 
-    Args: locations (list[str]): A list of locations.
+@lru_cache(maxsize=1)
+def get_prompt() -> tuple["PydanticOutputParser[LocationDict]", str, str]:
+    """
+    Build the output parser and the prompt. LangChain is only imported when the
+    first locations are sent to the model, not when the function starts.
 
-    Returns: A list of unique locations in a json format.
+    Returns: The parser and the prompt before and after the locations.
     """
-    llm = PromptLayerChatOpenAI(
-        model="gpt-4o-mini",
-        api_key=OPENAI_API_KEY,  # type: ignore
-        max_tokens=3000,
-        timeout=60,
-        pl_tags=["locations"],
+    from langchain_core.output_parsers import PydanticOutputParser
+    from langchain_core.prompts import PromptTemplate
+
+    parser = PydanticOutputParser(pydantic_object=LocationDict)
+
+    prompt = PromptTemplate(
+        template="Answer the user query.\n{format_instructions}\n{query}\nFormat the following locations:\n{locations}\n",
+        input_variables=["locations"],
+        partial_variables={
+            "format_instructions": parser.get_format_instructions(),
+            "query": location_query,
+        },
     )
-    # print(llm)
 
+    # The instructions are the same for every request: the prompt is split around
+    # the input once instead of formatting the template for each chunk.
+    prompt_prefix, prompt_suffix = prompt.format(locations="\0").split("\0")
+    return parser, prompt_prefix, prompt_suffix
+
+
+async def clean_locations(
+    locations: list[str],
+    db: google.cloud.firestore.Client | None = None,
+    on_cleaned: Callable[[dict[str, list[dict[str, Any]]]], None] | None = None,
+) -> tuple[LocationDict, list[str]]:
+    """
+    Clean a list of locations using OpenAI.
+    Locations found in the gazetteer are resolved locally, the others are read
+    from the cache and only the cache misses are sent to the model. Cache misses
+    already being cleaned by a concurrent request are awaited instead.
+
+    Args: locations (list[str]): A list of locations. db: The Firestore client used for the cache. on_cleaned: Called with the locations as soon as they are cleaned.
+
+    Returns: A list of unique locations in a json format, and the locations that couldn't be cleaned.
+    """
     print("Number of locations:", len(locations))
     # Remove duplicates.
     locations = list(set(locations))
@@ -62,63 +86,102 @@ async def clean_locations(locations: list[str]) -> LocationDict:
     total_cost = 0
     total_tokens = 0
 
-    async def async_predict(input_list: list[str]):
+    def report(values: dict[str, list[Location]]) -> None:
+        if on_cleaned is not None and values:
+            on_cleaned(
+                {
+                    key: [location.model_dump() for location in value]
+                    for key, value in values.items()
+                }
+            )
+
+    async def async_predict(input_list: list[str]) -> dict[str, list[Location]] | None:
         nonlocal total_cost, total_tokens
 
-        _input = prompt.format_prompt(locations=input_list)
-        data: LocationDict | None = None
+        parser, prompt_prefix, prompt_suffix = get_prompt()
+        _input = f"{prompt_prefix}{input_list}{prompt_suffix}"
 
-        for _ in range(0, 5):
-            # Time the request.
-            s = time.perf_counter()
-            print("Starting request...")
+        # Time the request.
+        s = time.perf_counter()
+        print("Starting request...")
 
-            with get_openai_callback() as cb:
-                output = await llm.apredict(_input.to_string())
-                total_cost += cb.total_cost
-                total_tokens += cb.total_tokens
+        completion = await complete(_input, tag="locations")
+        output = completion["text"]
+        total_cost += completion["cost"]
+        total_tokens += completion["tokens"]
 
-            elapsed = time.perf_counter() - s
-            print(
-                f"Request with {len(input_list)} elements took {elapsed:0.2f} seconds."
-            )
+        elapsed = time.perf_counter() - s
+        print(f"Request with {len(input_list)} elements took {elapsed:0.2f} seconds.")
+        locations_planner.observe(input_list, output, elapsed)
+
+        # The scheduler retries the keys of the chunks that couldn't be parsed.
+        try:
+            return parser.parse(output).locations
+        except ValidationError as e:
+            print("A validation error occurred:", e)
+        except Exception as e:
+            print("An exception occurred:", e)
+        return None
 
-            try:
-                data = parser.parse(output)
-            except ValidationError as e:
-                print("A validation error occurred:", e)
-                continue
-            except Exception as e:
-                print("An exception occurred:", e)
-                continue
-            break
+    async def on_chunk_cleaned(values: dict[str, list[Location]]) -> None:
+        total_data.locations.update(values)
+        report(values)
 
-        return data
+        if db is not None:
+            new_values = {
+                key: [location.model_dump() for location in value]
+                for key, value in values.items()
+            }
+            await asyncio.to_thread(locations_cache.set_many, db, new_values)
 
     total_data: LocationDict = LocationDict(locations={})
 
-    s = time.perf_counter()
-    while True:
-        missing_keys = list(set(locations) - set(total_data.locations.keys()))
-        if len(missing_keys) == 0:
-            break
-
-        # Split the locations into chunks.
-        chunk_size = 50
-        chunks = [
-            missing_keys[x : x + chunk_size]
-            for x in range(0, len(missing_keys), chunk_size)
+    resolved_values, remaining_locations = resolve_locations(locations)
+    total_data.locations.update(resolved_values)
+    report(resolved_values)
+    print("Number of locations resolved with the gazetteer:", len(resolved_values))
+    tracing.add(gazetteerHits=len(resolved_values))
+
+    missing_locations = remaining_locations
+
+    if db is not None:
+        cached_values = await asyncio.to_thread(
+            locations_cache.get_many, db, remaining_locations
+        )
+        cached_locations = {
+            key: [Location(**location) for location in value]
+            for key, value in cached_values.items()
+        }
+        total_data.locations.update(cached_locations)
+        report(cached_locations)
+        print("Number of cached locations:", len(cached_values))
+        tracing.event(
+            "cache_lookup",
+            cache=locations_cache.collection_name,
+            requested=len(remaining_locations),
+            hits=len(cached_values),
+        )
+        tracing.add(
+            cacheHits=len(cached_values),
+            cacheMisses=len(remaining_locations) - len(cached_values),
+        )
+        missing_locations = [
+            location
+            for location in remaining_locations
+            if location not in cached_values
         ]
-        try:
-            tasks = [async_predict(chunk) for chunk in chunks]
-            data_list = await asyncio.gather(*tasks)
 
-            # Data can be None if there was an error.
-            for data in data_list:
-                if data is None:
-                    continue
-                total_data.locations.update(data.locations)
+    s = time.perf_counter()
 
+    async def clean_missing_locations(keys: list[str]) -> None:
+        try:
+            unresolved_keys = await schedule(
+                keys,
+                async_predict,
+                on_chunk_cleaned,
+                chunk_size=MAX_CHUNK_SIZE,
+                planner=locations_planner,
+            )
         except Exception as e:
             elapsed = time.perf_counter() - s
             print("Total tokens:", total_tokens)
@@ -127,9 +190,30 @@ async def clean_locations(locations: list[str]) -> LocationDict:
             print("An error occurred. Please try again.", e)
             raise e
 
+        # They get the default location when the offers are formatted, and the
+        # offers are sent again by the next request.
+        if unresolved_keys:
+            print("Unresolved locations:", unresolved_keys)
+
+    if db is not None:
+        coalesced_values = await coalesce(
+            db, locations_cache, missing_locations, clean_missing_locations
+        )
+        coalesced_locations = {
+            key: [Location(**location) for location in value]
+            for key, value in coalesced_values.items()
+        }
+        total_data.locations.update(coalesced_locations)
+        report(coalesced_locations)
+    else:
+        await clean_missing_locations(missing_locations)
+
     elapsed = time.perf_counter() - s
     print("Total tokens:", total_tokens)
     print("Total cost: $", round(total_cost, 2))
     print(f"Total time: {elapsed:0.2f} seconds.")
 
-    return total_data
+    unresolved = [
+        location for location in locations if location not in total_data.locations
+    ]
+    return total_data, unresolved
@@ -0,0 +1,425 @@
+import asyncio
+import json
+import os
+import time
+from typing import Any, Callable, TypedDict
+
+import google.cloud.firestore  # type: ignore
+import tracing
+from batch_scheduler import schedule
+from chunk_planner import MAX_CHUNK_SIZE, ChunkPlanner
+from clean_bad_locations_openai import locations_cache
+from clean_salaries_openai import salaries_cache
+from gazetteer import resolve_locations
+from llm_dispatcher import complete_json
+from locations_types import Location, LocationDict
+from normalization_cache import NormalizationCache
+from pydantic import TypeAdapter, ValidationError
+from salaries_types import SalariesDict
+from salary_rules import resolve_salaries
+from single_flight import coalesce_many
+
+# Combined cleaning of the locations and the salaries: the locations and the
+# salaries of the offers are sent in one structured-output request instead of one
+# request per field. Each missing location and each missing salary is sent once,
+# an item of the request has a location, a salary or both. Disabled by default,
+# the two cleaners are used instead.
+COMBINED_EXTRACTION = os.getenv("COMBINED_EXTRACTION", "false") == "true"
+
+# The items are referred to by id, only the cleaned values are in the output.
+offers_planner = ChunkPlanner(initial_output_ratio=1.5)
+
+offers_query = """I have a list of internship offers with a location, a salary or both.
+For each offer, extract the city and the country from the location and the monthly salary as a number.
+Return one result per offer with the id of the offer.
+Put null for the locations of an offer without a location and for the salary of an offer without a salary.
+
+Locations:
+I don't want a zipcode. Only the city and the country.
+A location can contain several cities, return them all.
+Countries should not be acronyms: for example "USA" should be change to "United States".
+EPFL is refering to "Lausanne".
+
+Salaries:
+If there's a distinction between a bachelor and a master salary, pick the master salary.
+If more than one number given, always pick the lowest one.
+Put null if no salary is found.
+Put 0 if the salary is specified as "unpaid".
+"""
+
+# Strict structured outputs require every property and no additional properties.
+LOCATION_SCHEMA: dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "city": {"type": "string", "description": "city of a location"},
+        "country": {"type": "string", "description": "country of a location"},
+    },
+    "required": ["city", "country"],
+    "additionalProperties": False,
+}
+
+OFFERS_SCHEMA: dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "offers": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "id": {"type": "integer"},
+                    "locations": {
+                        "type": ["array", "null"],
+                        "items": LOCATION_SCHEMA,
+                        "description": "null if the offer has no location",
+                    },
+                    "salary": {
+                        "type": ["number", "null"],
+                        "description": "monthly salary",
+                    },
+                },
+                "required": ["id", "locations", "salary"],
+                "additionalProperties": False,
+            },
+        }
+    },
+    "required": ["offers"],
+    "additionalProperties": False,
+}
+
+locations_adapter = TypeAdapter(list[Location])
+salary_adapter = TypeAdapter(float | None)
+
+
+# An item sent to the model: a location, a salary or both.
+Item = tuple[str | None, str | None]
+
+
+class CleanedItem(TypedDict, total=False):
+    locations: list[Location]
+    salary: float | None
+
+
+class FieldValidation(TypedDict):
+    valid: int
+    invalid: int
+
+
+def _item_key(location: str | None, salary: str | None) -> str:
+    return json.dumps([location, salary], ensure_ascii=False)
+
+
+def build_items(
+    pairs: list[tuple[str, str]],
+    missing_locations: set[str],
+    missing_salaries: set[str],
+) -> dict[str, Item]:
+    """
+    Group the missing locations and salaries into items so that each of them is
+    sent once. A location and a salary of the same offer share an item.
+
+    Args: pairs (list[tuple[str, str]]): The (location, salary) pairs of the offers. missing_locations (set[str]): The locations to clean. missing_salaries (set[str]): The salaries to clean.
+
+    Returns: The items by key.
+    """
+    missing_locations = set(missing_locations)
+    missing_salaries = set(missing_salaries)
+    items: dict[str, Item] = {}
+
+    for location, salary in pairs:
+        item_location = location if location in missing_locations else None
+        item_salary = salary if salary in missing_salaries else None
+        if item_location is None and item_salary is None:
+            continue
+        missing_locations.discard(location)
+        missing_salaries.discard(salary)
+        items[_item_key(item_location, item_salary)] = (item_location, item_salary)
+
+    return items
+
+
+def validate_results(
+    results_items: list[dict[str, Any]], requested: list[Item]
+) -> tuple[dict[int, CleanedItem], dict[str, FieldValidation]]:
+    """
+    Validate each requested field of the results of the model. A result is kept
+    when all the fields requested for its item are valid.
+
+    Args: results_items (list[dict[str, Any]]): The results returned by the model. requested (list[Item]): The items sent to the model, by id.
+
+    Returns: The valid results by id, and the number of valid and invalid values of each field.
+    """
+    results: dict[int, CleanedItem] = {}
+    validation = {
+        "id": FieldValidation(valid=0, invalid=0),
+        "locations": FieldValidation(valid=0, invalid=0),
+        "salary": FieldValidation(valid=0, invalid=0),
+    }
+
+    for item in results_items:
+        item_id = item.get("id")
+        if not isinstance(item_id, int) or not 0 <= item_id < len(requested):
+            validation["id"]["invalid"] += 1
+            continue
+        validation["id"]["valid"] += 1
+
+        location, salary = requested[item_id]
+        result = CleanedItem()
+        valid = True
+
+        if location is not None:
+            try:
+                result["locations"] = locations_adapter.validate_python(
+                    item.get("locations")
+                )
+                validation["locations"]["valid"] += 1
+            except ValidationError:
+                validation["locations"]["invalid"] += 1
+                valid = False
+
+        if salary is not None:
+            try:
+                result["salary"] = salary_adapter.validate_python(item.get("salary"))
+                validation["salary"]["valid"] += 1
+            except ValidationError:
+                validation["salary"]["invalid"] += 1
+                valid = False
+
+        if valid:
+            results[item_id] = result
+
+    return results, validation
+
+
+async def clean_locations_and_salaries(
+    pairs: list[tuple[str, str]],
+    db: google.cloud.firestore.Client | None = None,
+    on_locations_cleaned: (
+        Callable[[dict[str, list[dict[str, Any]]]], None] | None
+    ) = None,
+    on_salaries_cleaned: Callable[[dict[str, float | None]], None] | None = None,
+) -> tuple[tuple[LocationDict, list[str]], tuple[SalariesDict, list[str]]]:
+    """
+    Clean the locations and the salaries of offers using OpenAI.
+    The locations and the salaries resolved with the gazetteer, the salary rules
+    or the caches are not sent to the model. Each missing location and salary is
+    sent once, in one structured-output request per chunk. The values already being
+    cleaned by a concurrent request are awaited instead.
+
+    Args: pairs (list[tuple[str, str]]): The (location, salary) pairs of the offers. db: The Firestore client used for the caches. on_locations_cleaned: Called with the locations as soon as they are cleaned. on_salaries_cleaned: Called with the salaries as soon as they are cleaned.
+
+    Returns: The unique locations and the unique salaries in a json format, each with the values that couldn't be cleaned.
+    """
+    print("Number of pairs:", len(pairs))
+    # Remove duplicates.
+    pairs = list(dict.fromkeys(pairs))
+    print("Number of unique pairs:", len(pairs))
+
+    total_cost = 0
+    total_tokens = 0
+    total_validation: dict[str, FieldValidation] = {}
+
+    total_locations = LocationDict(locations={})
+    total_salaries = SalariesDict(salaries={})
+
+    def report_locations(values: dict[str, list[Location]]) -> None:
+        total_locations.locations.update(values)
+        if on_locations_cleaned is not None and values:
+            on_locations_cleaned(
+                {
+                    key: [location.model_dump() for location in value]
+                    for key, value in values.items()
+                }
+            )
+
+    def report_salaries(values: dict[str, float | None]) -> None:
+        total_salaries.salaries.update(values)
+        if on_salaries_cleaned is not None and values:
+            on_salaries_cleaned(values)
+
+    unique_locations = list(dict.fromkeys(location for location, _ in pairs))
+    unique_salaries = list(dict.fromkeys(salary for _, salary in pairs))
+
+    resolved_locations, remaining_locations = resolve_locations(unique_locations)
+    report_locations(resolved_locations)
+    resolved_salaries, remaining_salaries = resolve_salaries(unique_salaries)
+    report_salaries(resolved_salaries)
+    tracing.add(
+        gazetteerHits=len(resolved_locations), salaryRulesHits=len(resolved_salaries)
+    )
+
+    if db is not None:
+        cached_locations, cached_salaries = await asyncio.gather(
+            asyncio.to_thread(locations_cache.get_many, db, remaining_locations),
+            asyncio.to_thread(salaries_cache.get_many, db, remaining_salaries),
+        )
+        report_locations(
+            {
+                key: [Location(**location) for location in value]
+                for key, value in cached_locations.items()
+            }
+        )
+        report_salaries(cached_salaries)
+
+        for cache, requested, hits in (
+            (locations_cache, remaining_locations, cached_locations),
+            (salaries_cache, remaining_salaries, cached_salaries),
+        ):
+            tracing.event(
+                "cache_lookup",
+                cache=cache.collection_name,
+                requested=len(requested),
+                hits=len(hits),
+            )
+            tracing.add(cacheHits=len(hits), cacheMisses=len(requested) - len(hits))
+
+    missing_locations = [
+        location
+        for location in unique_locations
+        if location not in total_locations.locations
+    ]
+    missing_salaries = [
+        salary for salary in unique_salaries if salary not in total_salaries.salaries
+    ]
+    # The items of every call of clean_missing_items.
+    missing_items: dict[str, Item] = {}
+
+    async def async_predict(input_list: list[str]) -> dict[str, CleanedItem] | None:
+        nonlocal total_cost, total_tokens
+
+        requested = [missing_items[key] for key in input_list]
+        offers: list[dict[str, Any]] = []
+        for i, (location, salary) in enumerate(requested):
+            offer: dict[str, Any] = {"id": i}
+            if location is not None:
+                offer["location"] = location
+            if salary is not None:
+                offer["salary"] = salary
+            offers.append(offer)
+        _input = f"{offers_query}\nFormat the following offers:\n{json.dumps(offers, ensure_ascii=False)}\n"
+
+        # Time the request.
+        s = time.perf_counter()
+        print("Starting request...")
+
+        completion = await complete_json(_input, "offers", OFFERS_SCHEMA)
+        total_cost += completion["cost"]
+        total_tokens += completion["tokens"]
+
+        elapsed = time.perf_counter() - s
+        print(f"Request with {len(input_list)} elements took {elapsed:0.2f} seconds.")
+        offers_planner.observe(input_list, completion["text"], elapsed)
+
+        # The output follows the schema unless the model refused or ran out of tokens.
+        try:
+            items = json.loads(completion["text"])["offers"]
+        except (ValueError, KeyError, TypeError) as e:
+            print("An exception occurred:", e)
+            return None
+
+        results, validation = validate_results(items, requested)
+        for field, counts in validation.items():
+            field_total = total_validation.setdefault(
+                field, FieldValidation(valid=0, invalid=0)
+            )
+            field_total["valid"] += counts["valid"]
+            field_total["invalid"] += counts["invalid"]
+
+        return {input_list[item_id]: result for item_id, result in results.items()}
+
+    async def on_chunk_cleaned(values: dict[str, CleanedItem]) -> None:
+        new_locations: dict[str, list[Location]] = {}
+        new_salaries: dict[str, float | None] = {}
+        for key, value in values.items():
+            location, salary = missing_items[key]
+            if location is not None:
+                new_locations[location] = value["locations"]
+            if salary is not None:
+                new_salaries[salary] = value["salary"]
+
+        report_locations(new_locations)
+        report_salaries(new_salaries)
+
+        if db is not None:
+            await asyncio.gather(
+                asyncio.to_thread(
+                    locations_cache.set_many,
+                    db,
+                    {
+                        key: [location.model_dump() for location in value]
+                        for key, value in new_locations.items()
+                    },
+                ),
+                asyncio.to_thread(salaries_cache.set_many, db, new_salaries),
+            )
+
+    s = time.perf_counter()
+
+    async def clean_missing_items(locations: list[str], salaries: list[str]) -> None:
+        items = build_items(pairs, set(locations), set(salaries))
+        missing_items.update(items)
+        print("Number of items sent to the model:", len(items))
+
+        try:
+            unresolved_keys = await schedule(
+                list(items),
+                async_predict,
+                on_chunk_cleaned,
+                chunk_size=MAX_CHUNK_SIZE,
+                planner=offers_planner,
+            )
+        except Exception as e:
+            elapsed = time.perf_counter() - s
+            print("Total tokens:", total_tokens)
+            print("Total cost: $", round(total_cost, 2))
+            print(f"Total time: {elapsed:0.2f} seconds.")
+            print("An error occurred. Please try again.", e)
+            raise e
+
+        # They get the default location and keep their salary text when the offers
+        # are formatted, and the offers are sent again by the next request.
+        if unresolved_keys:
+            print("Unresolved items:", unresolved_keys)
+
+    if db is not None:
+
+        async def compute(raws_by_cache: dict[NormalizationCache, list[str]]) -> None:
+            await clean_missing_items(
+                raws_by_cache[locations_cache], raws_by_cache[salaries_cache]
+            )
+
+        # Values being cleaned by a concurrent request are awaited instead.
+        coalesced_values = await coalesce_many(
+            db,
+            {locations_cache: missing_locations, salaries_cache: missing_salaries},
+            compute,
+        )
+        report_locations(
+            {
+                key: [Location(**location) for location in value]
+                for key, value in coalesced_values[locations_cache].items()
+            }
+        )
+        report_salaries(coalesced_values[salaries_cache])
+    else:
+        await clean_missing_items(missing_locations, missing_salaries)
+
+    for field, counts in total_validation.items():
+        print(f"Field {field}: {counts['valid']} valid, {counts['invalid']} invalid.")
+
+    elapsed = time.perf_counter() - s
+    print("Total tokens:", total_tokens)
+    print("Total cost: $", round(total_cost, 2))
+    print(f"Total time: {elapsed:0.2f} seconds.")
+
+    unresolved_locations = [
+        location
+        for location in unique_locations
+        if location not in total_locations.locations
+    ]
+    unresolved_salaries = [
+        salary for salary in unique_salaries if salary not in total_salaries.salaries
+    ]
+    return (
+        (total_locations, unresolved_locations),
+        (total_salaries, unresolved_salaries),
+    )
@@ -1,20 +1,21 @@
 import asyncio
-import os
 import time
-
-from dotenv import load_dotenv
-from langchain_community.callbacks import (
-    get_openai_callback,
-)
-from langchain_community.chat_models import PromptLayerChatOpenAI
-from langchain_core.output_parsers import PydanticOutputParser
-from langchain_core.prompts import PromptTemplate
+from functools import lru_cache
+from typing import TYPE_CHECKING, Callable
+
+import google.cloud.firestore  # type: ignore
+import tracing
+from batch_scheduler import schedule
+from chunk_planner import MAX_CHUNK_SIZE, ChunkPlanner
+from llm_dispatcher import complete
+from normalization_cache import NormalizationCache
 from pydantic import ValidationError
 from salaries_types import SalariesDict
+from salary_rules import resolve_salaries
+from single_flight import coalesce
 
-load_dotenv()
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-
+if TYPE_CHECKING:
+    from langchain_core.output_parsers import PydanticOutputParser
 
 salary_query = """I have a list of strings representing salaries.
 I want to get the salary as a number.
@@ -27,35 +28,58 @@ Put null if no salary is found.
 Put 0 if the salary is specified as "unpaid".
 """
 
-parser = PydanticOutputParser(pydantic_object=SalariesDict)
+# Bump when the prompt changes so that previously cached answers are not reused.
+PROMPT_VERSION = "1"
 
-prompt = PromptTemplate(
-    template="Answer the user query.\n{format_instructions}\n{query}\nFormat the following salaries:\n{salaries}\n",
-    input_variables=["salaries"],
-    partial_variables={
-        "format_instructions": parser.get_format_instructions(),
-        "query": salary_query,
-    },
-)
+salaries_cache = NormalizationCache("salaries_cache", PROMPT_VERSION)
 
+# Each salary is repeated in the output with a number.
+salaries_planner = ChunkPlanner(initial_output_ratio=1.5)
 
-async def clean_salaries(salaries: list[str]) -> SalariesDict:
-    """
-    Clean a list of salaries using OpenAI.
 
-    Args: salaries (list[str]): A list of salaries.
+@lru_cache(maxsize=1)
+def get_prompt() -> tuple["PydanticOutputParser[SalariesDict]", str, str]:
+    """
+    Build the output parser and the prompt. LangChain is only imported when the
+    first salaries are sent to the model, not when the function starts.
 
-    Returns: A list of unique salaries in a json format.
+    Returns: The parser and the prompt before and after the salaries.
     """
-    llm = PromptLayerChatOpenAI(
-        model="gpt-4o-mini",
-        api_key=OPENAI_API_KEY,  # type: ignore
-        max_tokens=3000,
-        timeout=60,
-        pl_tags=["salaries"],
+    from langchain_core.output_parsers import PydanticOutputParser
+    from langchain_core.prompts import PromptTemplate
+
+    parser = PydanticOutputParser(pydantic_object=SalariesDict)
+
+    prompt = PromptTemplate(
+        template="Answer the user query.\n{format_instructions}\n{query}\nFormat the following salaries:\n{salaries}\n",
+        input_variables=["salaries"],
+        partial_variables={
+            "format_instructions": parser.get_format_instructions(),
+            "query": salary_query,
+        },
     )
-    # print(llm)
 
+    # The instructions are the same for every request: the prompt is split around
+    # the input once instead of formatting the template for each chunk.
+    prompt_prefix, prompt_suffix = prompt.format(salaries="\0").split("\0")
+    return parser, prompt_prefix, prompt_suffix
+
+
+async def clean_salaries(
+    salaries: list[str],
+    db: google.cloud.firestore.Client | None = None,
+    on_cleaned: Callable[[dict[str, float | None]], None] | None = None,
+) -> tuple[SalariesDict, list[str]]:
+    """
+    Clean a list of salaries using OpenAI.
+    Salaries that can be parsed with rules are resolved locally, the others are
+    read from the cache and only the cache misses are sent to the model. Cache
+    misses already being cleaned by a concurrent request are awaited instead.
+
+    Args: salaries (list[str]): A list of salaries. db: The Firestore client used for the cache. on_cleaned: Called with the salaries as soon as they are cleaned.
+
+    Returns: A list of unique salaries in a json format, and the salaries that couldn't be cleaned.
+    """
     print("Number of salaries:", len(salaries))
     # Remove duplicates.
     salaries = list(set(salaries))
@@ -64,63 +88,87 @@ async def clean_salaries(salaries: list[str]) -> SalariesDict:
     total_cost = 0
     total_tokens = 0
 
-    async def async_predict(input_list: list[str]):
-        nonlocal total_cost, total_tokens
+    def report(values: dict[str, float | None]) -> None:
+        if on_cleaned is not None and values:
+            on_cleaned(values)
 
-        _input = prompt.format_prompt(salaries=input_list)
-        data: SalariesDict | None = None
+    async def async_predict(input_list: list[str]) -> dict[str, float | None] | None:
+        nonlocal total_cost, total_tokens
 
-        for _ in range(0, 5):
-            # Time the request.
-            s = time.perf_counter()
-            print("Starting request...")
+        parser, prompt_prefix, prompt_suffix = get_prompt()
+        _input = f"{prompt_prefix}{input_list}{prompt_suffix}"
 
-            with get_openai_callback() as cb:
-                output = await llm.apredict(_input.to_string())
-                total_cost += cb.total_cost
-                total_tokens += cb.total_tokens
+        # Time the request.
+        s = time.perf_counter()
+        print("Starting request...")
 
-            elapsed = time.perf_counter() - s
-            print(
-                f"Request with {len(input_list)} elements took {elapsed:0.2f} seconds."
-            )
+        completion = await complete(_input, tag="salaries")
+        output = completion["text"]
+        total_cost += completion["cost"]
+        total_tokens += completion["tokens"]
 
-            try:
-                data = parser.parse(output)
-            except ValidationError as e:
-                print("A validation error occurred:", e)
-                continue
-            except Exception as e:
-                print("An exception occurred:", e)
-                continue
-            break
+        elapsed = time.perf_counter() - s
+        print(f"Request with {len(input_list)} elements took {elapsed:0.2f} seconds.")
+        salaries_planner.observe(input_list, output, elapsed)
 
-        return data
+        # The scheduler retries the keys of the chunks that couldn't be parsed.
+        try:
+            return parser.parse(output).salaries
+        except ValidationError as e:
+            print("A validation error occurred:", e)
+        except Exception as e:
+            print("An exception occurred:", e)
+        return None
 
     total_data: SalariesDict = SalariesDict(salaries={})
 
-    s = time.perf_counter()
-    while True:
-        missing_keys = list(set(salaries) - set(total_data.salaries.keys()))
-        if len(missing_keys) == 0:
-            break
-
-        # Split the salaries into chunks.
-        chunk_size = 50
-        chunks = [
-            missing_keys[x : x + chunk_size]
-            for x in range(0, len(missing_keys), chunk_size)
+    resolved_values, remaining_salaries = resolve_salaries(salaries)
+    total_data.salaries.update(resolved_values)
+    report(resolved_values)
+    print("Number of salaries resolved with rules:", len(resolved_values))
+    tracing.add(salaryRulesHits=len(resolved_values))
+
+    missing_salaries = remaining_salaries
+
+    if db is not None:
+        cached_values = await asyncio.to_thread(
+            salaries_cache.get_many, db, remaining_salaries
+        )
+        total_data.salaries.update(cached_values)
+        report(cached_values)
+        print("Number of cached salaries:", len(cached_values))
+        tracing.event(
+            "cache_lookup",
+            cache=salaries_cache.collection_name,
+            requested=len(remaining_salaries),
+            hits=len(cached_values),
+        )
+        tracing.add(
+            cacheHits=len(cached_values),
+            cacheMisses=len(remaining_salaries) - len(cached_values),
+        )
+        missing_salaries = [
+            salary for salary in remaining_salaries if salary not in cached_values
         ]
-        try:
-            tasks = [async_predict(chunk) for chunk in chunks]
-            data_list = await asyncio.gather(*tasks)
 
-            # Data can be None if there was an error.
-            for data in data_list:
-                if data is None:
-                    continue
-                total_data.salaries.update(data.salaries)
+    s = time.perf_counter()
+
+    async def clean_missing_salaries(keys: list[str]) -> None:
+        new_values: dict[str, float | None] = {}
+
+        async def on_chunk_cleaned(values: dict[str, float | None]) -> None:
+            total_data.salaries.update(values)
+            new_values.update(values)
+            report(values)
 
+        try:
+            unresolved_keys = await schedule(
+                keys,
+                async_predict,
+                on_chunk_cleaned,
+                chunk_size=MAX_CHUNK_SIZE,
+                planner=salaries_planner,
+            )
         except Exception as e:
             elapsed = time.perf_counter() - s
             print("Total tokens:", total_tokens)
@@ -129,9 +177,27 @@ async def clean_salaries(salaries: list[str]) -> SalariesDict:
             print("An error occurred. Please try again.", e)
             raise e
 
+        # They keep their original text when the offers are formatted, and the
+        # offers are sent again by the next request.
+        if unresolved_keys:
+            print("Unresolved salaries:", unresolved_keys)
+
+        if new_values and db is not None:
+            await asyncio.to_thread(salaries_cache.set_many, db, new_values)
+
+    if db is not None:
+        coalesced_values = await coalesce(
+            db, salaries_cache, missing_salaries, clean_missing_salaries
+        )
+        total_data.salaries.update(coalesced_values)
+        report(coalesced_values)
+    else:
+        await clean_missing_salaries(missing_salaries)
+
     elapsed = time.perf_counter() - s
     print("Total tokens:", total_tokens)
     print("Total cost: $", round(total_cost, 2))
     print(f"Total time: {elapsed:0.2f} seconds.")
 
-    return total_data
+    unresolved = [salary for salary in salaries if salary not in total_data.salaries]
+    return total_data, unresolved
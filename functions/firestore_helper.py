@@ -1,13 +1,76 @@
 # pyright: reportUnknownMemberType=false
+import contextvars
+import random
+from concurrent.futures import Future, ThreadPoolExecutor
+
 import google.cloud.firestore  # type: ignore
 from google.cloud.firestore import Increment  # type: ignore
 
+# The formatting count of a user is split across shards: a document only sustains
+# about one write per second, and a user refreshing the listing increments the
+# count faster than that. Each increment goes to a random shard and the count is
+# the sum of the shards.
+
+NUM_SHARDS = 10
+SHARDS_COLLECTION = "formatting_count_shards"
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="counter")
+
+
+def _shards(
+    db: google.cloud.firestore.Client, email: str
+) -> google.cloud.firestore.CollectionReference:
+    return db.collection("users").document(email).collection(SHARDS_COLLECTION)
+
 
 def increment_formatting_count(db: google.cloud.firestore.Client, email: str):
-    users_collection = db.collection("users")
-    users_collection.document(email).set({"formattingCount": Increment(1)}, merge=True)
+    shard = str(random.randrange(NUM_SHARDS))
+    _shards(db, email).document(shard).set({"count": Increment(1)}, merge=True)
+
+
+def _print_error(future: "Future[None]") -> None:
+    error = future.exception()
+    if error is not None:
+        print(f"Error incrementing the formatting count: {error}")
+
+
+def increment_formatting_count_later(
+    db: google.cloud.firestore.Client, email: str
+) -> "Future[None]":
+    """
+    Increment the formatting count of a user in a background thread, so that the
+    write is not on the response path. Errors are printed. Like
+    BulkWriter.commit_later, the write can stall or be lost once the response is
+    returned unless the service has CPU always allocated.
+
+    Args: db: The Firestore client. email (str): The email of the user.
+
+    Returns: The future of the write.
+    """
+    context = contextvars.copy_context()
+    future = _executor.submit(context.run, increment_formatting_count, db, email)
+    future.add_done_callback(_print_error)
+    return future
+
+
+def get_formatting_count(db: google.cloud.firestore.Client, email: str) -> int:
+    """
+    Get the formatting count of a user: the sum of the shards and of the count
+    stored on the user document before the counter was sharded.
+
+    Args: db: The Firestore client. email (str): The email of the user.
+
+    Returns: The number of formatting requests of the user.
+    """
+    user = db.collection("users").document(email).get()
+    count = (user.to_dict() or {}).get("formattingCount", 0) if user.exists else 0
+    for shard in _shards(db, email).stream():
+        count += (shard.to_dict() or {}).get("count", 0)
+    return count
 
 
 __all__ = [
+    "get_formatting_count",
     "increment_formatting_count",
+    "increment_formatting_count_later",
 ]
@@ -0,0 +1,96 @@
+# pyright: reportUnknownMemberType=false
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, TypedDict
+
+import google.cloud.firestore  # type: ignore
+
+# Number of documents fetched by a single get_all call.
+DEFAULT_BATCH_SIZE = 300
+
+# Shared by the requests handled by a warm instance.
+executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="firestore-read")
+
+
+class ReadMetrics(TypedDict):
+    collection: str
+    requested: int
+    found: int
+    batches: int
+    elapsed: float
+
+
+def _get_batch(
+    db: google.cloud.firestore.Client, collection_name: str, document_ids: list[str]
+) -> tuple[dict[str, dict[str, Any]], float]:
+    start = time.perf_counter()
+    collection = db.collection(collection_name)
+    refs = [collection.document(document_id) for document_id in document_ids]
+    documents = {doc.id: doc.to_dict() for doc in db.get_all(refs) if doc.exists}
+    return documents, time.perf_counter() - start
+
+
+def read_documents(
+    db: google.cloud.firestore.Client,
+    document_ids_by_collection: dict[str, list[str]],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> tuple[dict[str, dict[str, dict[str, Any]]], list[ReadMetrics]]:
+    """
+    Read documents by id from one or more collections.
+    The ids are split in batches of get_all calls and all the batches of all the
+    collections are fetched concurrently.
+
+    Args: db: The Firestore client. document_ids_by_collection: The ids to read with the collection names as keys. batch_size: The number of documents per get_all call.
+
+    Returns: The existing documents by id for each collection, and the read metrics of each collection.
+    """
+    futures = {
+        collection_name: [
+            executor.submit(
+                _get_batch, db, collection_name, document_ids[i : i + batch_size]
+            )
+            for i in range(0, len(document_ids), batch_size)
+        ]
+        for collection_name, document_ids in document_ids_by_collection.items()
+    }
+
+    documents: dict[str, dict[str, dict[str, Any]]] = {}
+    metrics: list[ReadMetrics] = []
+
+    for collection_name, collection_futures in futures.items():
+        collection_documents: dict[str, dict[str, Any]] = {}
+        elapsed = 0.0
+        for future in collection_futures:
+            batch_documents, batch_elapsed = future.result()
+            collection_documents.update(batch_documents)
+            # The batches run concurrently, the slowest one gives the read time.
+            elapsed = max(elapsed, batch_elapsed)
+        documents[collection_name] = collection_documents
+
+        metrics.append(
+            ReadMetrics(
+                collection=collection_name,
+                requested=len(document_ids_by_collection[collection_name]),
+                found=len(collection_documents),
+                batches=len(collection_futures),
+                elapsed=elapsed,
+            )
+        )
+
+    return documents, metrics
+
+
+def print_read_metrics(metrics: list[ReadMetrics]) -> None:
+    for metric in metrics:
+        print(
+            f"Read {metric['found']}/{metric['requested']} documents from "
+            f"{metric['collection']} in {metric['batches']} batches "
+            f"({metric['elapsed']:0.2f} seconds)"
+        )
+
+
+__all__ = [
+    "ReadMetrics",
+    "print_read_metrics",
+    "read_documents",
+]
@@ -0,0 +1,150 @@
+import json
+import os
+import re
+import unicodedata
+from functools import lru_cache
+
+from locations_types import Location
+
+# Offline resolution of the most common locations (mostly Swiss and French cities)
+# so that they don't have to be sent to the LLM.
+
+GAZETTEER_FILE = os.path.join(os.path.dirname(__file__), "gazetteer.json")
+
+# Longest alias in words, e.g. "saint paul les durance".
+MAX_ALIAS_WORDS = 5
+
+# Zip codes like "1015" or "75013".
+POSTCODE_PATTERN = re.compile(r"^\d{4,5}$")
+
+# Words that can separate the locations of a text ("Geneva or Zurich").
+STOPWORDS = {"and", "et", "und", "or", "ou", "oder"}
+
+
+def fold(text: str) -> str:
+    """
+    Normalize a text for lookups: remove the accents, lowercase it and replace
+    the punctuation with spaces ("Zürich" -> "zurich", "St-Sulpice" -> "st sulpice").
+    """
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[^\w]+", " ", text.casefold())
+    return " ".join(text.split())
+
+
+class Gazetteer:
+    def __init__(
+        self, countries: dict[str, list[str]], cities: dict[str, dict[str, list[str]]]
+    ):
+        # Folded alias -> canonical country name.
+        self.countries: dict[str, str] = {}
+        # Folded alias -> canonical location.
+        self.cities: dict[str, Location] = {}
+
+        for country, aliases in countries.items():
+            for alias in [country, *aliases]:
+                self.countries[fold(alias)] = country
+
+        for country, country_cities in cities.items():
+            for city, aliases in country_cities.items():
+                for alias in [city, *aliases]:
+                    self.cities[fold(alias)] = Location(city=city, country=country)
+
+    def _tokens(self, location: str) -> list[str]:
+        return [
+            token
+            for token in fold(location).split()
+            if not POSTCODE_PATTERN.match(token) and token not in STOPWORDS
+        ]
+
+    def resolve(self, location: str) -> list[Location] | None:
+        """
+        Resolve a location text to a list of locations. Every word of the text,
+        besides the zip codes and the separators, must be a known city or country:
+        "London, Ontario" or "Rue de Genève 12, Renens" are left to the LLM.
+
+        Args: location (str): The location as written in the offer.
+
+        Returns: The locations found, or None if the text couldn't be resolved.
+        """
+        tokens = self._tokens(location)
+        found_cities: list[Location] = []
+        found_countries: set[str] = set()
+
+        i = 0
+        while i < len(tokens):
+            # Try the longest alias first so that "la chaux de fonds" wins over "la".
+            for n in range(min(MAX_ALIAS_WORDS, len(tokens) - i), 0, -1):
+                key = " ".join(tokens[i : i + n])
+                city = self.cities.get(key)
+                if city is not None:
+                    if city not in found_cities:
+                        found_cities.append(city)
+                    i += n
+                    break
+                country = self.countries.get(key)
+                if country is not None:
+                    found_countries.add(country)
+                    i += n
+                    break
+            else:
+                # An unknown word, e.g. a street, a company or an unknown city.
+                return None
+
+        if not found_cities:
+            return None
+
+        # "Paris, Texas" is not the Paris we know about.
+        if found_countries and any(
+            city.country not in found_countries for city in found_cities
+        ):
+            return None
+
+        return found_cities
+
+    def canonical_city(self, city: str) -> str:
+        """
+        Get the canonical name of a city ("Zürich" -> "Zurich").
+        Unknown cities are returned as is.
+        """
+        location = self.cities.get(fold(city))
+        return location.city if location is not None else city
+
+
+@lru_cache(maxsize=1)
+def get_gazetteer() -> Gazetteer:
+    with open(GAZETTEER_FILE, "r", encoding="utf-8") as gazetteer_file:
+        data = json.load(gazetteer_file)
+    return Gazetteer(data["countries"], data["cities"])
+
+
+def resolve_locations(
+    locations: list[str],
+) -> tuple[dict[str, list[Location]], list[str]]:
+    """
+    Resolve locally the locations found in the gazetteer.
+
+    Args: locations (list[str]): A list of locations.
+
+    Returns: The resolved locations and the list of the locations left for the LLM.
+    """
+    gazetteer = get_gazetteer()
+    resolved: dict[str, list[Location]] = {}
+    remaining: list[str] = []
+
+    for location in locations:
+        value = gazetteer.resolve(location)
+        if value is not None:
+            resolved[location] = value
+        else:
+            remaining.append(location)
+
+    return resolved, remaining
+
+
+__all__ = [
+    "Gazetteer",
+    "fold",
+    "get_gazetteer",
+    "resolve_locations",
+]
@@ -0,0 +1,122 @@
+# pyright: reportUnknownMemberType=false
+import uuid
+from datetime import datetime, timezone
+from typing import Callable, Literal, Optional, Protocol, TypedDict
+
+import google.cloud.firestore  # type: ignore
+
+# Background formatting of the offers: format_offers enqueues a job with the
+# numbers of the offers to format (the offers themselves are already stored in
+# offers_to_format) and a worker formats them. The extension polls the job status.
+
+JOBS_COLLECTION = "format_jobs"
+
+JobStatus = Literal["pending", "done", "error"]
+
+
+class FormatJob(TypedDict):
+    email: str
+    status: JobStatus
+    # Content hashes of the offers to format with the offer numbers as keys.
+    offerHashes: dict[str, str]
+    error: Optional[str]
+    createdAt: datetime
+
+
+def new_job(email: str, offer_hashes: dict[str, str]) -> FormatJob:
+    return FormatJob(
+        email=email,
+        status="pending",
+        offerHashes=offer_hashes,
+        error=None,
+        createdAt=datetime.now(timezone.utc),
+    )
+
+
+class JobQueue(Protocol):
+    def enqueue(self, db: google.cloud.firestore.Client, job: FormatJob) -> str: ...
+
+    def get(
+        self, db: google.cloud.firestore.Client, job_id: str
+    ) -> FormatJob | None: ...
+
+    def update(
+        self,
+        db: google.cloud.firestore.Client,
+        job_id: str,
+        status: JobStatus,
+        error: Optional[str] = None,
+    ) -> None: ...
+
+
+class FirestoreJobQueue:
+    """
+    Jobs are documents of the format_jobs collection. Creating the document
+    triggers the process_format_job function.
+    """
+
+    def enqueue(self, db: google.cloud.firestore.Client, job: FormatJob) -> str:
+        job_id = uuid.uuid4().hex
+        db.collection(JOBS_COLLECTION).document(job_id).set(job)
+        return job_id
+
+    def get(self, db: google.cloud.firestore.Client, job_id: str) -> FormatJob | None:
+        doc = db.collection(JOBS_COLLECTION).document(job_id).get()
+        return doc.to_dict() if doc.exists else None  # type: ignore
+
+    def update(
+        self,
+        db: google.cloud.firestore.Client,
+        job_id: str,
+        status: JobStatus,
+        error: Optional[str] = None,
+    ) -> None:
+        db.collection(JOBS_COLLECTION).document(job_id).update(
+            {"status": status, "error": error}
+        )
+
+
+class InMemoryJobQueue:
+    """
+    Local stand-in for the Firestore queue: jobs are kept in memory and processed
+    when run_pending is called.
+    """
+
+    def __init__(self):
+        self.jobs: dict[str, FormatJob] = {}
+
+    def enqueue(self, db: google.cloud.firestore.Client, job: FormatJob) -> str:
+        job_id = uuid.uuid4().hex
+        self.jobs[job_id] = job
+        return job_id
+
+    def get(self, db: google.cloud.firestore.Client, job_id: str) -> FormatJob | None:
+        return self.jobs.get(job_id)
+
+    def update(
+        self,
+        db: google.cloud.firestore.Client,
+        job_id: str,
+        status: JobStatus,
+        error: Optional[str] = None,
+    ) -> None:
+        self.jobs[job_id]["status"] = status
+        self.jobs[job_id]["error"] = error
+
+    def run_pending(
+        self,
+        db: google.cloud.firestore.Client,
+        process: Callable[[google.cloud.firestore.Client, str, FormatJob], None],
+    ) -> None:
+        for job_id, job in list(self.jobs.items()):
+            if job["status"] == "pending":
+                process(db, job_id, job)
+
+
+__all__ = [
+    "FirestoreJobQueue",
+    "FormatJob",
+    "InMemoryJobQueue",
+    "JobQueue",
+    "new_job",
+]
@@ -0,0 +1,311 @@
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, TypedDict
+
+import tracing
+from dotenv import load_dotenv
+
+if TYPE_CHECKING:
+    from langchain_community.chat_models import PromptLayerChatOpenAI
+
+# Shared entry point for the LLM requests of the cleaners. It bounds the number of
+# requests in flight, keeps under the OpenAI rate limits and retries the transient
+# errors with an exponential backoff.
+# The OpenAI and LangChain packages take most of the import time of the functions,
+# so they are only imported when the first request is sent.
+
+load_dotenv()
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+
+MODEL = "gpt-4o-mini"
+MAX_TOKENS = 3000
+REQUEST_TIMEOUT = 60
+
+MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "8"))
+# Limits of the OpenAI account, see https://platform.openai.com/account/limits.
+REQUESTS_PER_MINUTE = int(os.getenv("OPENAI_RPM", "500"))
+TOKENS_PER_MINUTE = int(os.getenv("OPENAI_TPM", "200000"))
+
+MAX_ATTEMPTS = 5
+BASE_BACKOFF = 1.0
+MAX_BACKOFF = 30.0
+
+
+@lru_cache(maxsize=1)
+def _retryable_errors() -> tuple[type[BaseException], ...]:
+    import openai
+
+    return (
+        openai.RateLimitError,
+        openai.APITimeoutError,
+        openai.APIConnectionError,
+        openai.InternalServerError,
+        asyncio.TimeoutError,
+    )
+
+
+class Completion(TypedDict):
+    text: str
+    cost: float
+    tokens: int
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously up to its capacity every minute.
+    Shared by all the event loops of the instance.
+    """
+
+    def __init__(self, per_minute: int):
+        self.capacity = per_minute
+        self.tokens = float(per_minute)
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self, amount: int) -> float:
+        """Take the tokens if available, otherwise return how long to wait."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self.paused_until:
+                return self.paused_until - now
+
+            elapsed = now - self.updated_at
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.capacity / 60)
+            self.updated_at = now
+
+            amount = min(amount, self.capacity)
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return 0
+
+            return (amount - self.tokens) * 60 / self.capacity
+
+    async def acquire(self, amount: int = 1) -> None:
+        while (wait := self._reserve(amount)) > 0:
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out tokens for a while, e.g. after a 429."""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+requests_bucket = TokenBucket(REQUESTS_PER_MINUTE)
+tokens_bucket = TokenBucket(TOKENS_PER_MINUTE)
+
+
+class _LoopState:
+    """
+    The asyncio objects (semaphore, HTTP connections) are bound to an event loop,
+    so they are kept per loop and reused by every request running on it.
+    """
+
+    def __init__(self):
+        import httpx
+        import openai
+
+        self.semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+        self.async_client = openai.AsyncOpenAI(
+            api_key=OPENAI_API_KEY,
+            timeout=REQUEST_TIMEOUT,
+            # The retries are handled by the dispatcher.
+            max_retries=0,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=MAX_CONCURRENCY,
+                    max_keepalive_connections=MAX_CONCURRENCY,
+                ),
+                timeout=REQUEST_TIMEOUT,
+            ),
+        )
+        self.llms: dict[str, "PromptLayerChatOpenAI"] = {}
+
+    def get_llm(self, tag: str) -> "PromptLayerChatOpenAI":
+        from langchain_community.chat_models import PromptLayerChatOpenAI
+
+        if tag not in self.llms:
+            self.llms[tag] = PromptLayerChatOpenAI(
+                model=MODEL,
+                api_key=OPENAI_API_KEY,  # type: ignore
+                max_tokens=MAX_TOKENS,
+                timeout=REQUEST_TIMEOUT,
+                max_retries=0,
+                async_client=self.async_client.chat.completions,
+                pl_tags=[tag],
+            )
+        return self.llms[tag]
+
+
+_loop_states: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState] = (
+    weakref.WeakKeyDictionary()
+)
+_loop_states_lock = threading.Lock()
+
+
+def _get_loop_state() -> _LoopState:
+    loop = asyncio.get_running_loop()
+    with _loop_states_lock:
+        if loop not in _loop_states:
+            _loop_states[loop] = _LoopState()
+        return _loop_states[loop]
+
+
+async def warm_up(tags: tuple[str, ...] = ("locations", "salaries")) -> None:
+    """Create the clients of the running event loop ahead of the first request."""
+    state = _get_loop_state()
+    for tag in tags:
+        state.get_llm(tag)
+
+
+def _is_rate_limit(error: BaseException) -> bool:
+    import openai
+
+    return isinstance(error, openai.RateLimitError)
+
+
+def _backoff(attempt: int, error: BaseException) -> float:
+    # Full jitter so that the requests failing together don't retry together.
+    delay = random.uniform(0, min(MAX_BACKOFF, BASE_BACKOFF * 2**attempt))
+
+    if _is_rate_limit(error):
+        retry_after = error.response.headers.get("retry-after")  # type: ignore
+        if retry_after is not None:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+
+    return delay
+
+
+async def _send_with_retries(
+    send: Callable[[_LoopState], Awaitable[Completion]],
+    estimated_tokens: int,
+    tag: str,
+) -> Completion:
+    state = _get_loop_state()
+    start = time.perf_counter()
+    waiting = 0.0
+
+    for attempt in range(MAX_ATTEMPTS):
+        wait_start = time.perf_counter()
+        await requests_bucket.acquire()
+        await tokens_bucket.acquire(estimated_tokens)
+
+        try:
+            async with state.semaphore:
+                waiting += time.perf_counter() - wait_start
+                request_start = time.perf_counter()
+                completion = await send(state)
+
+            tracing.event(
+                "llm_request",
+                tag=tag,
+                attempts=attempt + 1,
+                durationMs=round((time.perf_counter() - start) * 1000, 2),
+                lastAttemptMs=round((time.perf_counter() - request_start) * 1000, 2),
+                waitingMs=round(waiting * 1000, 2),
+                tokens=completion["tokens"],
+                cost=completion["cost"],
+            )
+            tracing.add(
+                llmRequests=1,
+                llmRetries=attempt,
+                llmTokens=completion["tokens"],
+                llmCost=completion["cost"],
+            )
+            return completion
+        except _retryable_errors() as e:
+            if attempt == MAX_ATTEMPTS - 1:
+                tracing.add(llmRequests=1, llmRetries=attempt, llmFailures=1)
+                raise
+
+            delay = _backoff(attempt, e)
+            print(
+                f"LLM request failed ({type(e).__name__}), retrying in {delay:0.2f} seconds."
+            )
+            if _is_rate_limit(e):
+                # Slow down every request of the instance, not only this one.
+                requests_bucket.pause(delay)
+            await asyncio.sleep(delay)
+
+    raise RuntimeError("Unreachable")
+
+
+async def complete(prompt: str, tag: str) -> Completion:
+    """
+    Send a prompt to the model.
+
+    Args: prompt (str): The prompt. tag (str): The PromptLayer tag of the request.
+
+    Returns: The completion with its cost and number of tokens.
+    """
+
+    from langchain_community.callbacks import get_openai_callback
+
+    async def send(state: _LoopState) -> Completion:
+        with get_openai_callback() as cb:
+            text = await state.get_llm(tag).apredict(prompt)
+        return Completion(text=text, cost=cb.total_cost, tokens=cb.total_tokens)
+
+    # OpenAI counts the max tokens of the completion in the rate limit.
+    return await _send_with_retries(send, len(prompt) // 4 + MAX_TOKENS, tag)
+
+
+async def complete_json(
+    prompt: str, schema_name: str, schema: dict[str, Any]
+) -> Completion:
+    """
+    Send a prompt to the model in structured-output mode: the completion is
+    constrained to the JSON schema, so it doesn't need to be parsed from free text.
+
+    Args: prompt (str): The prompt. schema_name (str): The name of the schema. schema (dict[str, Any]): A JSON schema following the rules of the strict mode.
+
+    Returns: The completion with its cost and number of tokens. The text is empty if the model refused to answer.
+    """
+
+    from langchain_community.callbacks.openai_info import (
+        get_openai_token_cost_for_model,
+    )
+
+    async def send(state: _LoopState) -> Completion:
+        response = await state.async_client.chat.completions.create(
+            model=MODEL,
+            max_tokens=MAX_TOKENS,
+            messages=[{"role": "user", "content": prompt}],
+            response_format={
+                "type": "json_schema",
+                "json_schema": {"name": schema_name, "strict": True, "schema": schema},
+            },
+        )
+        message = response.choices[0].message
+        if message.refusal:
+            print("The model refused to answer:", message.refusal)
+
+        cost = 0.0
+        tokens = 0
+        if response.usage is not None:
+            tokens = response.usage.total_tokens
+            cost = get_openai_token_cost_for_model(
+                MODEL, response.usage.prompt_tokens
+            ) + get_openai_token_cost_for_model(
+                MODEL, response.usage.completion_tokens, is_completion=True
+            )
+        return Completion(text=message.content or "", cost=cost, tokens=tokens)
+
+    return await _send_with_retries(send, len(prompt) // 4 + MAX_TOKENS, schema_name)
+
+
+__all__ = [
+    "Completion",
+    "TokenBucket",
+    "complete",
+    "complete_json",
+    "warm_up",
+]
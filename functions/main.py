@@ -1,12 +1,17 @@
 import asyncio
 import json
 import os
+import queue
 import re
+import threading
 import time
-from typing import Any
+from typing import Any, Callable, Iterator
 
 import google.cloud.firestore  # type: ignore
+import tracing
+from bulk_writer import BulkWriter
 from clean_bad_locations_openai import clean_locations as clean_locations_openai
+from clean_offers_openai import COMBINED_EXTRACTION, clean_locations_and_salaries
 from clean_salaries_openai import clean_salaries as clean_salaries_openai
 from data_types.Offer import Location, Offer, OfferToFormat, Salary
 
@@ -14,18 +19,43 @@ from data_types.Offer import Location, Offer, OfferToFormat, Salary
 from firebase_admin import firestore, initialize_app  # type: ignore
 
 # The Cloud Functions for Firebase SDK to create Cloud Functions and set up triggers.
-from firebase_functions import https_fn, options  # type: ignore
-from firestore_helper import increment_formatting_count
+from firebase_functions import firestore_fn, https_fn, options  # type: ignore
+from firestore_helper import increment_formatting_count_later
+from firestore_reads import print_read_metrics, read_documents
+from job_queue import FirestoreJobQueue, FormatJob, JobQueue, new_job
+from locations_types import LocationDict
+from offer_hash import SOURCE_HASH_FIELD, UNRESOLVED_HASH, compute_offer_hash
+from runtime import Runtime
+from salaries_types import SalariesDict
 
 app = initialize_app()
 
+# Reused by the requests handled by a warm instance.
+runtime = Runtime(lambda: firestore.client(app))  # type: ignore
+
+# Functions that send offers to the model.
+LLM_FUNCTIONS = {"format_offers", "process_format_job"}
+
+# Deployed instances create their clients while waiting for the first request.
+# Every function is deployed from this module: the LLM packages are only loaded
+# by the functions that use them.
+if os.getenv("K_SERVICE"):
+    threading.Thread(
+        target=runtime.warm_up,
+        args=(os.getenv("FUNCTION_TARGET") in LLM_FUNCTIONS,),
+        daemon=True,
+    ).start()
+
 
 def get_db() -> google.cloud.firestore.Client:
-    return firestore.client(app)  # type: ignore
+    return runtime.db
 
 
 WEBHOOK_SECRET = os.environ["LEMON_SQUEEZY_SIGNING_SECRET"]
 
+# Replaced by an InMemoryJobQueue in tests.
+job_queue: JobQueue = FirestoreJobQueue()
+
 ISA_ORIGIN = "https://isa.epfl.ch"
 EXTENSION_ORIGIN = "chrome-extension://cgdpalglfipokmbjbofifdlhlkpcipnk"
 
@@ -50,10 +80,284 @@ def merge_formatted_data_into_offer(
     return formatted_offer
 
 
-def chunk_list(lst: list[Any], n: int):
-    """Yield successive n-sized chunks from lst."""
-    for i in range(0, len(lst), n):
-        yield lst[i : i + n]
+def get_unchanged_formatted_offers(
+    db: google.cloud.firestore.Client, offer_hashes: dict[str, str]
+) -> tuple[list[Offer], list[str]]:
+    """
+    Get the formatted offers whose source offer didn't change.
+    The offers formatted before the source hashes were stored have no hash: their
+    stored offer to format is compared instead, and the hash is added to the
+    unchanged ones so that the next requests don't read it again.
+
+    Args: db: The Firestore client. offer_hashes (dict[str, str]): The content hashes with the offer numbers as keys.
+
+    Returns: The unchanged formatted offers and the numbers of the offers to format.
+    """
+    if not offer_hashes:
+        return [], []
+
+    with tracing.span("firestore_read", documents=len(offer_hashes)) as span:
+        documents, metrics = read_documents(db, {"offers": list(offer_hashes)})
+        print_read_metrics(metrics)
+        span["found"] = len(documents["offers"])
+
+    legacy_offers: dict[str, dict[str, Any]] = {}
+    for number, formatted_offer in documents["offers"].items():
+        if SOURCE_HASH_FIELD not in formatted_offer:
+            legacy_offers[number] = formatted_offer
+
+    if legacy_offers:
+        with tracing.span("firestore_read_legacy", documents=len(legacy_offers)):
+            legacy_documents, metrics = read_documents(
+                db, {"offers_to_format": list(legacy_offers)}
+            )
+            print_read_metrics(metrics)
+
+        writer = BulkWriter(db)
+        for number, offer_to_format in legacy_documents["offers_to_format"].items():
+            if compute_offer_hash(offer_to_format) == offer_hashes[number]:
+                legacy_offers[number][SOURCE_HASH_FIELD] = offer_hashes[number]
+                writer.set(
+                    db.collection("offers").document(number),
+                    {SOURCE_HASH_FIELD: offer_hashes[number]},
+                    merge=True,
+                )
+        if len(writer):
+            print("Adding the source hash to", len(writer), "formatted offers")
+            # The offers are compared again if the writes are lost.
+            writer.commit_later()
+
+    with tracing.span("diff") as span:
+        unchanged_offers: list[Offer] = []
+        unchanged_numbers: set[str] = set()
+
+        for number, formatted_offer in documents["offers"].items():
+            source_hash = formatted_offer.pop(SOURCE_HASH_FIELD, None)
+            if source_hash == offer_hashes[number]:
+                unchanged_offers.append(formatted_offer)  # type: ignore
+                unchanged_numbers.add(number)
+
+        changed_numbers = [
+            number for number in offer_hashes if number not in unchanged_numbers
+        ]
+        span["unchanged"] = len(unchanged_offers)
+        span["changed"] = len(changed_numbers)
+
+    return unchanged_offers, changed_numbers
+
+
+def format_new_offers(
+    db: google.cloud.firestore.Client,
+    offers_to_format: list[OfferToFormat],
+    offer_hashes: dict[str, str],
+    on_cleaned: Callable[[str, dict[str, Any]], None] | None = None,
+) -> list[Offer]:
+    """
+    Clean the locations and salaries of the offers and store the formatted offers.
+    The offers whose location or salary couldn't be cleaned are stored with
+    UNRESOLVED_HASH so that the next request formats them again.
+
+    Args: db: The Firestore client. offers_to_format (list[OfferToFormat]): The offers to format. offer_hashes (dict[str, str]): The content hashes with the offer numbers as keys. on_cleaned: Called with "locations" or "salaries" and the values as soon as they are cleaned.
+
+    Returns: The formatted offers.
+    """
+
+    def on_locations_cleaned(values: dict[str, Any]) -> None:
+        if on_cleaned is not None:
+            on_cleaned("locations", values)
+
+    def on_salaries_cleaned(values: dict[str, Any]) -> None:
+        if on_cleaned is not None:
+            on_cleaned("salaries", values)
+
+    async def clean_locations_and_salaries_in_parallel(
+        locations: list[str], salaries: list[str]
+    ) -> tuple[dict[str, list[Location]], dict[str, Salary], tuple[set[str], set[str]]]:
+        if COMBINED_EXTRACTION:
+            with tracing.span("llm_locations_and_salaries", offers=len(locations)):
+                (
+                    (clean_locations, unresolved_locations),
+                    (clean_salaries, unresolved_salaries),
+                ) = await clean_locations_and_salaries(
+                    list(zip(locations, salaries)),
+                    db,
+                    on_locations_cleaned,
+                    on_salaries_cleaned,
+                )
+        else:
+
+            async def clean_locations_task() -> tuple[LocationDict, list[str]]:
+                with tracing.span("llm_locations", strings=len(set(locations))):
+                    return await clean_locations_openai(
+                        locations, db, on_locations_cleaned
+                    )
+
+            async def clean_salaries_task() -> tuple[SalariesDict, list[str]]:
+                with tracing.span("llm_salaries", strings=len(set(salaries))):
+                    return await clean_salaries_openai(
+                        salaries, db, on_salaries_cleaned
+                    )
+
+            (
+                (clean_locations, unresolved_locations),
+                (clean_salaries, unresolved_salaries),
+            ) = await asyncio.gather(clean_locations_task(), clean_salaries_task())
+
+        return (
+            clean_locations.model_dump()["locations"],
+            clean_salaries.model_dump()["salaries"],
+            (set(unresolved_locations), set(unresolved_salaries)),
+        )
+
+    locationsMap, salariesMap, (unresolved_locations, unresolved_salaries) = (
+        runtime.run(
+            clean_locations_and_salaries_in_parallel(
+                [o["location"] for o in offers_to_format],
+                [o["salary"] for o in offers_to_format],
+            )
+        )
+    )
+
+    offers_collection = db.collection("offers")
+    formatted_offers: list[Offer] = []
+
+    writer = BulkWriter(db)
+
+    # Update formatted_offers with cleaned data
+    with tracing.span("merge", offers=len(offers_to_format)):
+        for offer in offers_to_format:
+            new_formatted_offer = merge_formatted_data_into_offer(
+                offer, salariesMap, locationsMap
+            )
+            source_hash = offer_hashes[offer["number"]]
+            if (
+                offer["location"] in unresolved_locations
+                or offer["salary"] in unresolved_salaries
+            ):
+                source_hash = UNRESOLVED_HASH
+            writer.set(
+                offers_collection.document(offer["number"]),
+                {**new_formatted_offer, SOURCE_HASH_FIELD: source_hash},
+                merge=True,
+            )
+            formatted_offers.append(new_formatted_offer)
+
+    # Committed before the response: the CPU of the instance is throttled once the
+    # response is returned, see BulkWriter.commit_later.
+    with tracing.span("batch_write_offers", writes=len(offers_to_format)):
+        writer.commit()
+
+    return formatted_offers
+
+
+def increment_count(db: google.cloud.firestore.Client, email: str) -> None:
+    # The write happens after the response is returned. A lost increment only
+    # undercounts the statistics, see increment_formatting_count_later.
+    with tracing.span("counter_increment"):
+        increment_formatting_count_later(db, email)
+
+
+def stream_formatted_offers(
+    db: google.cloud.firestore.Client,
+    email: str,
+    unchanged_offers: list[Offer],
+    offers_to_format: list[OfferToFormat],
+    offer_hashes: dict[str, str],
+    trace: tracing.Trace | None = None,
+) -> Iterator[str]:
+    """
+    Yield the formatted offers as NDJSON lines: the unchanged offers first, then
+    each new offer as soon as its location and its salary are cleaned.
+    The trace of the request is finished once the stream is done.
+    """
+    try:
+        for offer in unchanged_offers:
+            yield json.dumps({"offer": offer}) + "\n"
+
+        events: queue.Queue[tuple[str, dict[str, Any]] | None] = queue.Queue()
+        results: list[Offer] = []
+        errors: list[Exception] = []
+
+        def run():
+            try:
+                results.extend(
+                    tracing.run_in(
+                        trace,
+                        format_new_offers,
+                        db,
+                        offers_to_format,
+                        offer_hashes,
+                        lambda kind, values: events.put((kind, values)),
+                    )
+                )
+            except Exception as e:
+                errors.append(e)
+            finally:
+                events.put(None)
+
+        threading.Thread(target=run, daemon=True).start()
+
+        cleaned: dict[str, dict[str, Any]] = {"locations": {}, "salaries": {}}
+        pending = {offer["number"]: offer for offer in offers_to_format}
+
+        while (event := events.get()) is not None:
+            kind, values = event
+            cleaned[kind].update(values)
+
+            for number, offer in list(pending.items()):
+                if (
+                    offer["location"] in cleaned["locations"]
+                    and offer["salary"] in cleaned["salaries"]
+                ):
+                    del pending[number]
+                    formatted_offer = merge_formatted_data_into_offer(
+                        offer, cleaned["salaries"], cleaned["locations"]
+                    )
+                    yield json.dumps({"offer": formatted_offer}) + "\n"
+
+        if errors:
+            yield json.dumps({"error": str(errors[0])}) + "\n"
+            return
+
+        # Offers whose location or salary the model never returned get the defaults.
+        for formatted_offer in results:
+            if formatted_offer["number"] in pending:
+                yield json.dumps({"offer": formatted_offer}) + "\n"
+
+        tracing.run_in(trace, increment_count, db, email)
+    finally:
+        if trace is not None:
+            trace.finish()
+
+
+def run_format_job(db: google.cloud.firestore.Client, job_id: str, job: FormatJob):
+    """
+    Format the offers of a background job. The offers to format were stored in
+    offers_to_format when the job was enqueued. An offer overwritten since then by
+    another request no longer has the hash of the job: it is skipped and left to
+    that request.
+    """
+    try:
+        offer_hashes = job["offerHashes"]
+        documents, metrics = read_documents(
+            db, {"offers_to_format": list(offer_hashes)}
+        )
+        print_read_metrics(metrics)
+
+        offers_to_format: list[OfferToFormat] = []
+        for number, offer in documents["offers_to_format"].items():
+            if compute_offer_hash(offer) == offer_hashes[number]:  # type: ignore
+                offers_to_format.append(offer)  # type: ignore
+        skipped = len(offer_hashes) - len(offers_to_format)
+        if skipped:
+            print("Job", job_id, "skipped", skipped, "changed or missing offers")
+        print("Job", job_id, "needs to update", len(offers_to_format), "offers")
+
+        format_new_offers(db, offers_to_format, offer_hashes)
+        job_queue.update(db, job_id, "done")
+    except Exception as e:
+        print(f"Error running format job {job_id}: {str(e)}")
+        job_queue.update(db, job_id, "error", str(e))
 
 
 @https_fn.on_request(
@@ -63,6 +367,7 @@ def chunk_list(lst: list[Any], n: int):
     ),
     timeout_sec=180,
 )
+@tracing.traced("format_offers")
 # pyright: reportUnknownMemberType=false
 def format_offers(req: https_fn.Request) -> https_fn.Response:
     start_time = time.time()
@@ -71,10 +376,19 @@ def format_offers(req: https_fn.Request) -> https_fn.Response:
         return https_fn.Response("Method not allowed", status=405)
 
     try:
-        json_data: dict[str, Any] = req.get_json()
-        data = json_data.get("data", {})
-        email: str = data.get("email", "")
-        offers: list[OfferToFormat] = data.get("offers", [])
+        with tracing.span("parse") as span:
+            json_data: dict[str, Any] = req.get_json()
+            data = json_data.get("data", {})
+            email: str = data.get("email", "")
+            offers: list[OfferToFormat] = data.get("offers", [])
+            # Sent first by the extension so that only the changed offers are uploaded.
+            hashes: list[dict[str, str]] = data.get("hashes", [])
+            # Return the unchanged offers right away and format the others in a job.
+            background: bool = data.get("background", False)
+            # Stream the offers as NDJSON as soon as they are formatted.
+            stream: bool = data.get("stream", False)
+            span["offers"] = len(offers)
+            span["hashes"] = len(hashes)
 
         if not email:
             return https_fn.Response(
@@ -87,99 +401,108 @@ def format_offers(req: https_fn.Request) -> https_fn.Response:
         # Stocker les offres à formater
         db = get_db()
         offers_to_format_collection = db.collection("offers_to_format")
-        offers_collection = db.collection("offers")
-        formatted_offers: list[Offer] = []
-        offers_to_format: list[OfferToFormat] = []
 
-        # Fetch all existing offers in multiple queries
-        existing_offers = {}
-        existing_formatted_offers = {}
-        offer_numbers = [offer["number"] for offer in offers]
-
-        for chunk in chunk_list(offer_numbers, 30):
-            chunk_existing_offers = offers_to_format_collection.where(
-                "number", "in", chunk
-            ).stream()
-            existing_offers.update(
-                {doc.id: doc.to_dict() for doc in chunk_existing_offers}
+        if not offers and hashes:
+            unchanged_offers, missing_numbers = get_unchanged_formatted_offers(
+                db, {item["number"]: item["hash"] for item in hashes}
             )
+            print("Missing", len(missing_numbers), "offers")
+
+            if not missing_numbers:
+                increment_count(db, email)
 
-            chunk_existing_formatted_offers = offers_collection.where(
-                "number", "in", chunk
-            ).stream()
-            existing_formatted_offers.update(
-                {doc.id: doc.to_dict() for doc in chunk_existing_formatted_offers}
+            return https_fn.Response(
+                json.dumps(
+                    {
+                        "data": {
+                            "offers": unchanged_offers,
+                            "missingNumbers": missing_numbers,
+                        }
+                    }
+                ),
+                content_type="application/json",
             )
 
-        batch = db.batch()
+        with tracing.span("hash", offers=len(offers)):
+            offer_hashes = {
+                offer["number"]: compute_offer_hash(offer) for offer in offers
+            }
+        formatted_offers, changed_numbers = get_unchanged_formatted_offers(
+            db, offer_hashes
+        )
+        changed_numbers_set = set(changed_numbers)
+        offers_to_format = [
+            offer for offer in offers if offer["number"] in changed_numbers_set
+        ]
 
-        for offer in offers:
-            offer_number = offer["number"]
-            existing_offer = existing_offers.get(offer_number)
+        writer = BulkWriter(db)
 
-            if not existing_offer or existing_offer != offer:
-                batch.set(
-                    offers_to_format_collection.document(offer_number),
-                    offer,  # type: ignore
-                    merge=True,
-                )
-                offers_to_format.append(offer)
-            else:
-                formatted_offer = existing_formatted_offers.get(offer_number)
-                if formatted_offer:
-                    formatted_offers.append(formatted_offer)
-                else:
-                    print(
-                        f"Error: Formatted offer not found for existing offer {offer_number}"
-                    )
+        # Overwritten rather than merged: the stored offer must keep the hash the
+        # background jobs check.
+        for offer in offers_to_format:
+            writer.set(
+                offers_to_format_collection.document(offer["number"]),
+                offer,  # type: ignore
+            )
 
         print("Need to update", len(offers_to_format), "offers")
 
-        # Commit the batch write
-        batch.commit()
+        # Only the background jobs read the stored offers to format, the other
+        # requests don't wait for the writes.
+        with tracing.span(
+            "batch_write_offers_to_format",
+            writes=len(offers_to_format),
+            deferred=not background,
+        ):
+            if background:
+                writer.commit()
+            else:
+                writer.commit_later()
+
+        if background:
+            # No job is needed when every offer is unchanged.
+            job_id = None
+            if offers_to_format:
+                job_id = job_queue.enqueue(
+                    db,
+                    new_job(
+                        email,
+                        {
+                            offer["number"]: offer_hashes[offer["number"]]
+                            for offer in offers_to_format
+                        },
+                    ),
+                )
+                print("Enqueued job", job_id)
 
-        async def clean_locations_and_salaries_in_parallel(
-            locations: list[str], salaries: list[str]
-        ) -> tuple[dict[str, list[Location]], dict[str, Salary]]:
-            clean_locations_task = clean_locations_openai(locations)
-            clean_salaries_task = clean_salaries_openai(salaries)
-            clean_locations, clean_salaries = await asyncio.gather(
-                clean_locations_task, clean_salaries_task
-            )
-            return clean_locations.model_dump()[
-                "locations"
-            ], clean_salaries.model_dump()["salaries"]
+            increment_count(db, email)
 
-        locationsMap, salariesMap = asyncio.run(
-            clean_locations_and_salaries_in_parallel(
-                [o["location"] for o in offers_to_format],
-                [o["salary"] for o in offers_to_format],
+            return https_fn.Response(
+                json.dumps({"data": {"offers": formatted_offers, "jobId": job_id}}),
+                content_type="application/json",
             )
-        )
 
-        # Create a new batch for formatted offers
-        batch = db.batch()
-
-        # Update formatted_offers with cleaned data
-        for offer in offers_to_format:
-            new_formatted_offer = merge_formatted_data_into_offer(
-                offer, salariesMap, locationsMap
-            )
-            batch.set(
-                offers_collection.document(offer["number"]),
-                new_formatted_offer,  # type:ignore
-                merge=True,
+        if stream:
+            return https_fn.Response(
+                stream_formatted_offers(
+                    db,
+                    email,
+                    formatted_offers,
+                    offers_to_format,
+                    offer_hashes,
+                    # Finished by the stream.
+                    tracing.detach(),
+                ),
+                content_type="application/x-ndjson",
             )
-            formatted_offers.append(new_formatted_offer)
 
-        # Commit the batch write for formatted offers
-        batch.commit()
+        formatted_offers.extend(format_new_offers(db, offers_to_format, offer_hashes))
 
         end_time = time.time()
         execution_time = end_time - start_time
         print(f"format_offers execution time: {execution_time:.2f} seconds")
 
-        increment_formatting_count(db, email)
+        increment_count(db, email)
 
         return https_fn.Response(
             json.dumps({"data": formatted_offers}),
@@ -194,55 +517,16 @@ def format_offers(req: https_fn.Request) -> https_fn.Response:
         return https_fn.Response(json.dumps({"error": str(e)}), status=500)
 
 
-@https_fn.on_request(
-    cors=options.CorsOptions(
-        cors_origins=[EXTENSION_ORIGIN],
-        cors_methods=["POST"],
-    ),
-)
-def handle_sign_up(req: https_fn.Request) -> https_fn.Response:
-    if req.method != "POST":
-        return https_fn.Response("Method not allowed", status=405)
-
-    try:
-        json_data: dict[str, Any] = req.get_json()
-        data: dict[str, Any] = json_data.get("data", {})
-        user_email: str | None = data.get("email")
-
-        if not user_email:
-            return https_fn.Response("Email is required", status=400)
-
-        if not re.match(r"[^@]+@epfl\.ch$", user_email):
-            return https_fn.Response(
-                "Invalid email domain. Must be an EPFL email.", status=400
-            )
-
-        print("New user sign-up with email:", user_email)
-
-        db = get_db()
-        users_ref = db.collection("users")
-        user_doc = users_ref.document(user_email)
-
-        # Check if user already exists
-        if user_doc.get().exists:
-            return https_fn.Response("User already exists", status=400)
-
-        # Create the user document
-        user_doc.set({})
+@firestore_fn.on_document_created(document="format_jobs/{jobId}", timeout_sec=540)
+@tracing.traced("process_format_job")
+def process_format_job(
+    event: firestore_fn.Event[firestore_fn.DocumentSnapshot | None],
+) -> None:
+    if event.data is None:
+        return
 
-        return https_fn.Response(
-            json.dumps(
-                {
-                    "data": {
-                        "success": True,
-                    }
-                }
-            ),
-            content_type="application/json",
-        )
-    except Exception as e:
-        print(f"Error handling sign-up: {str(e)}")
-        return https_fn.Response(json.dumps({"error": str(e)}), status=500)
+    job: FormatJob = event.data.to_dict()  # type: ignore
+    run_format_job(get_db(), event.params["jobId"], job)
 
 
 @https_fn.on_request(
@@ -251,53 +535,43 @@ def handle_sign_up(req: https_fn.Request) -> https_fn.Response:
         cors_methods=["POST"],
     ),
 )
-def handle_sign_in(req: https_fn.Request) -> https_fn.Response:
+def get_format_job(req: https_fn.Request) -> https_fn.Response:
     if req.method != "POST":
         return https_fn.Response("Method not allowed", status=405)
 
     try:
         json_data: dict[str, Any] = req.get_json()
         data: dict[str, Any] = json_data.get("data", {})
-        user_email: str | None = data.get("email")
-
-        if not user_email:
-            return https_fn.Response("Email is required", status=400)
-
-        if not re.match(r"[^@]+@epfl\.ch$", user_email):
-            return https_fn.Response(
-                "Invalid email domain. Must be an EPFL email.", status=400
-            )
+        email: str = data.get("email", "")
+        job_id: str = data.get("jobId", "")
 
-        print("User sign-in with email:", user_email)
+        if not email or not job_id:
+            return https_fn.Response("Email and job id are required", status=400)
 
         db = get_db()
-        user_doc = db.collection("users").document(user_email).get()
+        job = job_queue.get(db, job_id)
 
-        if user_doc.exists:
-            return https_fn.Response(
-                json.dumps(
-                    {
-                        "data": {
-                            "success": True,
-                        }
-                    }
-                ),
-                content_type="application/json",
-            )
-        else:
+        if job is None or job["email"] != email:
+            return https_fn.Response("Job not found", status=404)
+
+        if job["status"] != "done":
             return https_fn.Response(
-                json.dumps(
-                    {
-                        "data": {
-                            "success": False,
-                            "error": "User not found",
-                        }
-                    }
-                ),
-                status=404,
+                json.dumps({"data": {"status": job["status"], "error": job["error"]}}),
                 content_type="application/json",
             )
 
+        documents, metrics = read_documents(db, {"offers": list(job["offerHashes"])})
+        print_read_metrics(metrics)
+
+        formatted_offers: list[Offer] = []
+        for formatted_offer in documents["offers"].values():
+            formatted_offer.pop(SOURCE_HASH_FIELD, None)
+            formatted_offers.append(formatted_offer)  # type: ignore
+
+        return https_fn.Response(
+            json.dumps({"data": {"status": "done", "offers": formatted_offers}}),
+            content_type="application/json",
+        )
     except Exception as e:
-        print(f"Error handling sign-in: {str(e)}")
+        print(f"Error getting format job: {str(e)}")
         return https_fn.Response(json.dumps({"error": str(e)}), status=500)
@@ -0,0 +1,116 @@
+# pyright: reportUnknownMemberType=false
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any
+
+import google.cloud.firestore  # type: ignore
+from bulk_writer import BulkWriter
+from firestore_reads import print_read_metrics, read_documents
+
+# Number of entries kept in memory by each warm instance.
+DEFAULT_MEMORY_SIZE = 10_000
+
+
+class NormalizationCache:
+    """
+    Cache mapping raw strings (locations, salaries, ...) to their normalized value.
+
+    Entries are stored in a Firestore collection shared by all the instances.
+    The document id is a hash of the prompt version and the raw string so that
+    any string can be used as a key and changing the prompt invalidates the cache.
+    The most recently used entries are also kept in memory so that warm instances
+    don't have to hit Firestore for hot keys.
+    """
+
+    def __init__(
+        self,
+        collection_name: str,
+        prompt_version: str,
+        memory_size: int = DEFAULT_MEMORY_SIZE,
+    ):
+        self.collection_name = collection_name
+        self.prompt_version = prompt_version
+        self.memory_size = memory_size
+        self._memory: OrderedDict[str, Any] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_from_memory(self, raws: list[str]) -> dict[str, Any]:
+        values: dict[str, Any] = {}
+        with self._lock:
+            for raw in raws:
+                if raw in self._memory:
+                    self._memory.move_to_end(raw)
+                    values[raw] = self._memory[raw]
+        return values
+
+    def _set_in_memory(self, values: dict[str, Any]) -> None:
+        with self._lock:
+            for raw, value in values.items():
+                self._memory[raw] = value
+                self._memory.move_to_end(raw)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def document_id(self, raw: str) -> str:
+        key = f"{self.prompt_version}\n{raw}"
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def get_many(
+        self, db: google.cloud.firestore.Client, raws: list[str]
+    ) -> dict[str, Any]:
+        """
+        Get the cached values of a list of raw strings.
+
+        Args: db: The Firestore client. raws (list[str]): The raw strings to look up.
+
+        Returns: A dict with the raw strings found in the cache as keys.
+        """
+        values = self._get_from_memory(raws)
+        missing_raws = [raw for raw in raws if raw not in values]
+        if not missing_raws:
+            return values
+
+        # Batched reads for all the keys missing from memory.
+        document_ids = [self.document_id(raw) for raw in missing_raws]
+        documents, metrics = read_documents(db, {self.collection_name: document_ids})
+        print_read_metrics(metrics)
+
+        stored_values: dict[str, Any] = {
+            entry["raw"]: entry["value"]
+            for entry in documents[self.collection_name].values()
+        }
+
+        self._set_in_memory(stored_values)
+        values.update(stored_values)
+
+        return values
+
+    def set_many(
+        self, db: google.cloud.firestore.Client, values: dict[str, Any]
+    ) -> None:
+        """
+        Store normalized values in the cache.
+
+        Args: db: The Firestore client. values (dict[str, Any]): The values with the raw strings as keys.
+        """
+        self._set_in_memory(values)
+
+        collection = db.collection(self.collection_name)
+        writer = BulkWriter(db)
+
+        for raw, value in values.items():
+            writer.set(
+                collection.document(self.document_id(raw)),
+                {
+                    "raw": raw,
+                    "value": value,
+                    "promptVersion": self.prompt_version,
+                },
+            )
+        writer.commit()
+
+
+__all__ = [
+    "NormalizationCache",
+]
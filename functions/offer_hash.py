@@ -0,0 +1,35 @@
+import hashlib
+import json
+from typing import Any
+
+# Field of the formatted offers holding the hash of the offer they were formatted from.
+SOURCE_HASH_FIELD = "sourceHash"
+
+# Source hash of the formatted offers whose location or salary couldn't be cleaned.
+# It never matches the hash of an offer, so the next request formats them again.
+UNRESOLVED_HASH = "unresolved"
+
+
+def compute_offer_hash(offer: Any) -> str:
+    """
+    Compute a stable hash of the content of an offer to format.
+
+    The offer is serialized as JSON with sorted keys, no whitespace and escaped
+    non-ASCII characters. The extension computes the exact same hash
+    (see chrome-extension/src/serviceWorker/helpers/offerHashing.ts).
+
+    Args: offer: The offer as sent by the extension.
+
+    Returns: The SHA-256 hex digest of the offer.
+    """
+    serialized = json.dumps(
+        offer, sort_keys=True, separators=(",", ":"), ensure_ascii=True
+    )
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+__all__ = [
+    "SOURCE_HASH_FIELD",
+    "UNRESOLVED_HASH",
+    "compute_offer_hash",
+]
@@ -0,0 +1,80 @@
+import asyncio
+import threading
+from typing import Any, Callable, Coroutine, TypeVar
+
+import google.cloud.firestore  # type: ignore
+
+# Objects created once per container and reused by the requests handled by a warm
+# instance: the Firestore client and an event loop running in a background thread.
+# The LLM clients are bound to the event loop, so keeping the loop alive keeps their
+# pooled connections open between requests.
+
+T = TypeVar("T")
+
+
+class Runtime:
+    def __init__(self, create_db: Callable[[], google.cloud.firestore.Client]):
+        self._create_db = create_db
+        self._db: google.cloud.firestore.Client | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def _ensure_db(self) -> google.cloud.firestore.Client:
+        if self._db is None:
+            with self._lock:
+                if self._db is None:
+                    self._db = self._create_db()
+        return self._db
+
+    @property
+    def db(self) -> google.cloud.firestore.Client:
+        return self._ensure_db()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    self._thread = threading.Thread(
+                        target=loop.run_forever, name="runtime-loop", daemon=True
+                    )
+                    self._thread.start()
+                    self._loop = loop
+        return self._loop
+
+    def run(self, coroutine: Coroutine[Any, Any, T]) -> T:
+        """
+        Run a coroutine on the shared event loop and wait for its result.
+        Replaces asyncio.run, which creates and closes a new loop on every call.
+        The context variables of the caller (e.g. the trace) are passed on.
+
+        Args: coroutine: The coroutine to run.
+
+        Returns: The result of the coroutine.
+        """
+        if threading.current_thread() is self._thread:
+            coroutine.close()
+            raise RuntimeError("Runtime.run can't be called from the runtime loop.")
+
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def warm_up(self, llm: bool = True) -> None:
+        """
+        Create the Firestore client and the LLM clients ahead of the first request.
+
+        Args: llm (bool): Also import the LLM packages, create their clients and load the tokenizer.
+        """
+        self._ensure_db()
+        if llm:
+            import chunk_planner
+            import llm_dispatcher
+
+            self.run(llm_dispatcher.warm_up())
+            chunk_planner.warm_up()
+
+
+__all__ = [
+    "Runtime",
+]
@@ -0,0 +1,149 @@
+import re
+
+# Rule-based parsing of the salary strings that don't need the LLM.
+# It follows the same semantics as the salary prompt: the monthly salary as a
+# number, the lowest one if more than one number is given, null if no salary is
+# found and 0 if the internship is unpaid. Anything else is left to the LLM.
+
+NO_SALARY_LABELS = {
+    "",
+    "-",
+    "--",
+    "/",
+    "?",
+    "n/a",
+    "na",
+    "none",
+    "tbd",
+    "tbc",
+    "to be defined",
+    "to be discussed",
+    "to be determined",
+    "negotiable",
+    "à définir",
+    "a définir",
+    "à discuter",
+    "a discuter",
+}
+
+UNPAID_LABELS = {
+    "unpaid",
+    "not paid",
+    "no salary",
+    "non rémunéré",
+    "non remunéré",
+    "non rémunérée",
+    "non payé",
+    "bénévole",
+    "benevole",
+}
+
+_CURRENCY = r"(?:chf|sfr\.?|fr\.|frs\.?|eur|euros?|€|usd|\$)"
+_NUMBER = (
+    r"(?P<{name}>\d{{1,3}}(?:[' ,]\d{{3}})+|\d+)"
+    r"(?:\.(?P<{name}_decimals>\d{{1,2}}))?"
+    r"(?:\.-+|\.|-+(?=\s|$))?"
+    r"(?P<{name}_k>k)?"
+)
+_GROSS = r"(?:gross|brut|brutto)"
+_PERIOD = (
+    r"(?:(?:/|per|par|pro|a)\s*(?:month|mois|monat|mth|mo\.?)|monthly|mensuel(?:le)?"
+    r"|(?:per|par|pro)\s+months?)"
+)
+
+
+def _amount(name: str) -> str:
+    return rf"(?:{_CURRENCY}\s*)?{_NUMBER.format(name=name)}(?:\s*{_CURRENCY})?"
+
+
+SALARY_PATTERN = re.compile(
+    rf"^(?:(?:between|entre)\s+)?{_amount('low')}"
+    rf"(?:\s*(?:-|–|—|to|à|a|and|et)\s*{_amount('high')})?"
+    rf"(?:\s*{_GROSS})?(?:\s*{_PERIOD})?(?:\s*{_GROSS})?$"
+)
+
+# Below this, a number is more likely an hourly or daily rate than a monthly salary.
+MIN_MONTHLY_SALARY = 300
+# Above this, a number is more likely a yearly or total amount than a monthly salary.
+MAX_MONTHLY_SALARY = 15_000
+
+
+def _normalize(salary: str) -> str:
+    salary = salary.replace("’", "'").replace("`", "'")
+    # split() also takes care of the non-breaking spaces.
+    salary = " ".join(salary.lower().split())
+    return salary.rstrip(".!")
+
+
+def _to_number(match: re.Match[str], name: str) -> float:
+    number = float(re.sub(r"[' ,]", "", match.group(name)))
+    decimals = match.group(f"{name}_decimals")
+    if decimals:
+        number += float(f"0.{decimals}")
+    if match.group(f"{name}_k"):
+        number *= 1000
+    return number
+
+
+def parse_salary(salary: str) -> tuple[bool, float | None]:
+    """
+    Parse a salary string with rules.
+
+    Args: salary (str): The salary as written in the offer.
+
+    Returns: A tuple (resolved, value). When resolved is False the string is ambiguous and should be sent to the LLM.
+    """
+    normalized = _normalize(salary)
+
+    if normalized in NO_SALARY_LABELS:
+        return True, None
+
+    if normalized in UNPAID_LABELS:
+        return True, 0
+
+    match = SALARY_PATTERN.match(normalized)
+    if match is None:
+        return False, None
+
+    numbers = [_to_number(match, "low")]
+    if match.group("high") is not None:
+        numbers.append(_to_number(match, "high"))
+
+    value = min(numbers)
+    if value == 0:
+        return True, 0
+    if value < MIN_MONTHLY_SALARY:
+        return False, None
+    if max(numbers) > MAX_MONTHLY_SALARY:
+        return False, None
+
+    return True, value
+
+
+def resolve_salaries(
+    salaries: list[str],
+) -> tuple[dict[str, float | None], list[str]]:
+    """
+    Resolve locally the salaries that can be parsed with rules.
+
+    Args: salaries (list[str]): A list of salaries.
+
+    Returns: The resolved salaries and the list of the salaries left for the LLM.
+    """
+    resolved: dict[str, float | None] = {}
+    remaining: list[str] = []
+
+    for salary in salaries:
+        is_resolved, value = parse_salary(salary)
+        if is_resolved:
+            resolved[salary] = value
+        else:
+            remaining.append(salary)
+
+    return resolved, remaining
+
+
+__all__ = [
+    "parse_salary",
+    "resolve_salaries",
+]
@@ -0,0 +1,236 @@
+# pyright: reportUnknownMemberType=false
+import asyncio
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable
+
+import google.cloud.firestore  # type: ignore
+from bulk_writer import BulkWriter
+from firestore_reads import read_documents
+from normalization_cache import NormalizationCache
+
+# Coalescing of the LLM work between concurrent requests: the first request to see
+# a raw string claims it with a lease, the others wait for its result in the cache
+# instead of sending the same string to the model.
+
+LEASES_COLLECTION = "normalization_leases"
+
+# Longer than the LLM timeout so that a lease doesn't expire during a request.
+# A lease left by a crashed request is ignored once expired, and deleted by the TTL
+# policy on expireAt configured in firestore.indexes.json (deployed with
+# `firebase deploy --only firestore:indexes`). Firestore deletes expired documents
+# within about a day.
+LEASE_TTL = timedelta(seconds=90)
+
+# How long a request waits for the strings claimed by another request.
+WAIT_TIMEOUT = 60
+POLL_INTERVAL = 1.0
+
+# Firestore limits a transaction to 500 writes.
+MAX_TRANSACTION_SIZE = 500
+
+
+def _lease_id(cache: NormalizationCache, raw: str) -> str:
+    return f"{cache.collection_name}-{cache.document_id(raw)}"
+
+
+def _lease_ref(
+    db: google.cloud.firestore.Client, cache: NormalizationCache, raw: str
+) -> google.cloud.firestore.DocumentReference:
+    return db.collection(LEASES_COLLECTION).document(_lease_id(cache, raw))
+
+
+def claim_leases(
+    db: google.cloud.firestore.Client,
+    cache: NormalizationCache,
+    raws: list[str],
+    owner: str,
+) -> list[str]:
+    """
+    Claim the raw strings that no other request is working on.
+
+    Args: db: The Firestore client. cache: The cache the results will be written to. raws (list[str]): The raw strings to claim. owner (str): The id of the request.
+
+    Returns: The raw strings claimed by this request.
+    """
+    claimed: list[str] = []
+
+    @google.cloud.firestore.transactional
+    def claim_chunk(
+        transaction: google.cloud.firestore.Transaction, chunk: list[str]
+    ) -> list[str]:
+        refs = {raw: _lease_ref(db, cache, raw) for raw in chunk}
+        now = datetime.now(timezone.utc)
+
+        busy: set[str] = set()
+        for doc in transaction.get_all(list(refs.values())):
+            if doc.exists and doc.get("expireAt") > now:
+                busy.add(doc.id)
+
+        chunk_claimed: list[str] = []
+        for raw, ref in refs.items():
+            if ref.id in busy:
+                continue
+            transaction.set(ref, {"owner": owner, "expireAt": now + LEASE_TTL})
+            chunk_claimed.append(raw)
+
+        return chunk_claimed
+
+    for i in range(0, len(raws), MAX_TRANSACTION_SIZE):
+        chunk = raws[i : i + MAX_TRANSACTION_SIZE]
+        claimed.extend(claim_chunk(db.transaction(), chunk))
+
+    return claimed
+
+
+def release_leases(
+    db: google.cloud.firestore.Client, cache: NormalizationCache, raws: list[str]
+) -> None:
+    writer = BulkWriter(db)
+    for raw in raws:
+        writer.delete(_lease_ref(db, cache, raw))
+    writer.commit()
+
+
+async def wait_for_values(
+    db: google.cloud.firestore.Client,
+    cache: NormalizationCache,
+    raws: list[str],
+    timeout: float = WAIT_TIMEOUT,
+) -> dict[str, Any]:
+    """
+    Poll the cache until the values of the raw strings are available.
+    Stops waiting for a string when its lease is released without a value.
+
+    Args: db: The Firestore client. cache: The cache the results are written to. raws (list[str]): The raw strings claimed by other requests. timeout (float): The maximum time to wait in seconds.
+
+    Returns: The values found before the timeout.
+    """
+    values: dict[str, Any] = {}
+    pending_raws = raws
+    deadline = time.perf_counter() + timeout
+
+    while pending_raws and time.perf_counter() < deadline:
+        await asyncio.sleep(POLL_INTERVAL)
+        values.update(await asyncio.to_thread(cache.get_many, db, pending_raws))
+        pending_raws = [raw for raw in pending_raws if raw not in values]
+        if not pending_raws:
+            break
+
+        leases, _ = await asyncio.to_thread(
+            read_documents,
+            db,
+            {LEASES_COLLECTION: [_lease_id(cache, raw) for raw in pending_raws]},
+        )
+        released_raws = {
+            raw
+            for raw in pending_raws
+            if _lease_id(cache, raw) not in leases[LEASES_COLLECTION]
+        }
+        if released_raws:
+            # The value may have been written between the two reads.
+            values.update(
+                await asyncio.to_thread(cache.get_many, db, list(released_raws))
+            )
+        pending_raws = [raw for raw in pending_raws if raw not in released_raws]
+
+    return values
+
+
+async def coalesce_many(
+    db: google.cloud.firestore.Client,
+    raws_by_cache: dict[NormalizationCache, list[str]],
+    compute: Callable[[dict[NormalizationCache, list[str]]], Awaitable[None]],
+) -> dict[NormalizationCache, dict[str, Any]]:
+    """
+    Like coalesce, for raw strings of several caches that are cleaned together,
+    e.g. the locations and the salaries of the combined extraction.
+
+    Args: db: The Firestore client. raws_by_cache: The cache misses of each cache. compute: The function cleaning the raw strings of each cache.
+
+    Returns: The values computed by the other requests for each cache.
+    """
+    owner = uuid.uuid4().hex
+    claimed_lists = await asyncio.gather(
+        *[
+            asyncio.to_thread(claim_leases, db, cache, raws, owner)
+            for cache, raws in raws_by_cache.items()
+        ]
+    )
+    claimed = dict(zip(raws_by_cache, claimed_lists))
+    others: dict[NormalizationCache, list[str]] = {}
+    for cache, raws in raws_by_cache.items():
+        claimed_set = set(claimed[cache])
+        others[cache] = [raw for raw in raws if raw not in claimed_set]
+    print(
+        "Number of strings already being cleaned:",
+        sum(len(raws) for raws in others.values()),
+    )
+
+    async def wait_for_others() -> dict[NormalizationCache, dict[str, Any]]:
+        values = await asyncio.gather(
+            *[wait_for_values(db, cache, raws) for cache, raws in others.items()]
+        )
+        return dict(zip(others, values))
+
+    waiting_task = asyncio.create_task(wait_for_others())
+
+    try:
+        await compute(claimed)
+    except Exception:
+        waiting_task.cancel()
+        raise
+    finally:
+        await asyncio.gather(
+            *[
+                asyncio.to_thread(release_leases, db, cache, raws)
+                for cache, raws in claimed.items()
+            ]
+        )
+
+    values = await waiting_task
+
+    # The other request failed or is too slow: do the work ourselves.
+    leftover = {
+        cache: [raw for raw in raws if raw not in values[cache]]
+        for cache, raws in others.items()
+    }
+    num_leftover = sum(len(raws) for raws in leftover.values())
+    if num_leftover:
+        print("Number of strings not cleaned by other requests:", num_leftover)
+        await compute(leftover)
+
+    return values
+
+
+async def coalesce(
+    db: google.cloud.firestore.Client,
+    cache: NormalizationCache,
+    raws: list[str],
+    compute: Callable[[list[str]], Awaitable[None]],
+) -> dict[str, Any]:
+    """
+    Run compute on the raw strings that no other request is working on and wait
+    for the others. The strings still missing after the wait are computed too.
+    compute must write its results to the cache before returning.
+
+    Args: db: The Firestore client. cache: The cache the results are written to. raws (list[str]): The cache misses. compute: The function cleaning a list of raw strings.
+
+    Returns: The values computed by the other requests.
+    """
+
+    async def compute_cache(raws_by_cache: dict[NormalizationCache, list[str]]):
+        await compute(raws_by_cache[cache])
+
+    values = await coalesce_many(db, {cache: raws}, compute_cache)
+    return values[cache]
+
+
+__all__ = [
+    "claim_leases",
+    "coalesce",
+    "coalesce_many",
+    "release_leases",
+    "wait_for_values",
+]
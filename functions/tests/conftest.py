@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The functions are flat modules of the functions folder.
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
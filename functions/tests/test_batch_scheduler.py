@@ -0,0 +1,40 @@
+from batch_scheduler import reconcile_keys
+
+
+def test_a_rewritten_key_is_not_matched_to_a_key_with_other_numbers():
+    requested = [
+        "Bachelor: 3000 CHF, Master: 4500 CHF",
+        "Bachelor: 3000 CHF, Master: 3500 CHF",
+    ]
+
+    values = reconcile_keys(requested, {"Bachelor: 3000 CHF,  Master: 3500CHF": 3500})
+
+    assert values == {"Bachelor: 3000 CHF, Master: 3500 CHF": 3500}
+
+
+def test_near_identical_keys_are_not_mixed_up():
+    values = reconcile_keys(
+        ["Lausanne 1015", "Lausanne 1005"], {"Lausanne  1005 ": "x"}
+    )
+
+    assert values == {"Lausanne 1005": "x"}
+
+
+def test_the_most_similar_returned_key_wins():
+    requested = ["EPFL Innovation Park, Lausanne", "EPFL Innovation Park, Lausane"]
+
+    values = reconcile_keys(
+        requested,
+        {"EPFL Innovation Park Lausanne": "a", "EPFL Innovation Park Lausane": "b"},
+    )
+
+    assert values == {
+        "EPFL Innovation Park, Lausanne": "a",
+        "EPFL Innovation Park, Lausane": "b",
+    }
+
+
+def test_thousands_separators_are_ignored_when_comparing_numbers():
+    values = reconcile_keys(["4'500 CHF par mois"], {"4500 CHF par mois.": 4500})
+
+    assert values == {"4'500 CHF par mois": 4500}
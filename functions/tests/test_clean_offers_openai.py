@@ -0,0 +1,47 @@
+from clean_offers_openai import build_items, validate_results
+
+
+def test_each_missing_value_is_sent_once():
+    pairs = [
+        ("Lausanne", "3000"),
+        ("Lausanne", "a lot"),
+        ("Somewhere", "a lot"),
+        ("Somewhere", "3000"),
+    ]
+
+    items = build_items(pairs, {"Somewhere"}, {"a lot"})
+
+    assert list(items.values()) == [(None, "a lot"), ("Somewhere", None)]
+
+
+def test_a_location_and_a_salary_of_the_same_offer_share_an_item():
+    items = build_items([("Somewhere", "a lot")], {"Somewhere"}, {"a lot"})
+
+    assert list(items.values()) == [("Somewhere", "a lot")]
+
+
+def test_only_the_requested_fields_are_validated():
+    requested = [("Somewhere", None), (None, "a lot")]
+    results_items = [
+        {
+            "id": 0,
+            "locations": [{"city": "Somewhere", "country": "Switzerland"}],
+            "salary": None,
+        },
+        {"id": 1, "locations": None, "salary": 2500},
+    ]
+
+    results, validation = validate_results(results_items, requested)
+
+    assert set(results[0]) == {"locations"}
+    assert results[1] == {"salary": 2500}
+    assert validation["locations"] == {"valid": 1, "invalid": 0}
+    assert validation["salary"] == {"valid": 1, "invalid": 0}
+
+
+def test_a_result_with_an_invalid_requested_field_is_dropped():
+    results, _ = validate_results(
+        [{"id": 0, "locations": None, "salary": 2500}], [("Somewhere", "a lot")]
+    )
+
+    assert results == {}
@@ -0,0 +1,19 @@
+import asyncio
+import json
+
+import clean_salaries_openai
+
+
+def test_the_salaries_the_model_drops_are_returned_as_unresolved(monkeypatch):
+    async def complete(prompt: str, tag: str):
+        output = json.dumps({"salaries": {"a lot": 5000}})
+        return {"text": output, "cost": 0, "tokens": 0}
+
+    monkeypatch.setattr(clean_salaries_openai, "complete", complete)
+
+    salaries, unresolved = asyncio.run(
+        clean_salaries_openai.clean_salaries(["3000", "a lot", "ask HR"])
+    )
+
+    assert salaries.salaries == {"3000": 3000, "a lot": 5000}
+    assert unresolved == ["ask HR"]
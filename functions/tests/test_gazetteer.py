@@ -0,0 +1,42 @@
+import pytest
+from gazetteer import get_gazetteer
+from locations_types import Location
+
+
+@pytest.mark.parametrize(
+    "location",
+    [
+        "Paris, Texas",
+        "Oracle Labs, Zürich; also Casablanca, Morocco",
+        "Fribourg or Freiburg im Breisgau",
+        "Rue de Genève 12, Renens",
+        "London, Ontario",
+    ],
+)
+def test_unknown_words_are_left_to_the_llm(location: str):
+    assert get_gazetteer().resolve(location) is None
+
+
+@pytest.mark.parametrize(
+    "location, expected",
+    [
+        ("Lausanne", [Location(city="Lausanne", country="Switzerland")]),
+        (
+            "1015 Lausanne, VD, Suisse",
+            [Location(city="Lausanne", country="Switzerland")],
+        ),
+        (
+            "Geneva or Zurich",
+            [
+                Location(city="Geneva", country="Switzerland"),
+                Location(city="Zurich", country="Switzerland"),
+            ],
+        ),
+        (
+            "La Chaux-de-Fonds",
+            [Location(city="La Chaux-de-Fonds", country="Switzerland")],
+        ),
+    ],
+)
+def test_known_locations_are_resolved(location: str, expected: list[Location]):
+    assert get_gazetteer().resolve(location) == expected
@@ -0,0 +1,13 @@
+from benchmark.import_profile import (
+    IMPORT_BUDGET_MS,
+    lazy_packages_loaded,
+    main_import_ms,
+    profile_main,
+)
+
+
+def test_main_imports_lazily_within_the_budget():
+    imports, modules = profile_main()
+
+    assert lazy_packages_loaded(modules) == []
+    assert main_import_ms(imports) <= IMPORT_BUDGET_MS
@@ -0,0 +1,68 @@
+import json
+import os
+import shutil
+import subprocess
+
+import pytest
+from offer_hash import compute_offer_hash
+
+# Offers with their hashes, checked against both implementations: the extension
+# only uploads the offers whose hash differs from the one computed here.
+VECTORS_FILE = os.path.join(os.path.dirname(__file__), "offer_hash_vectors.json")
+EXTENSION_HASHING_FILE = os.path.join(
+    os.path.dirname(__file__),
+    "..",
+    "..",
+    "chrome-extension",
+    "src",
+    "serviceWorker",
+    "helpers",
+    "offerHashing.ts",
+)
+
+HASH_OFFERS_SCRIPT = """
+import { readFileSync } from 'node:fs'
+import { hashOffer } from %s
+const offers = JSON.parse(readFileSync(0, 'utf8'))
+console.log(JSON.stringify(await Promise.all(offers.map(hashOffer))))
+"""
+
+
+def load_vectors() -> list[dict]:
+    with open(VECTORS_FILE) as f:
+        return json.load(f)
+
+
+def node_can_run_typescript() -> bool:
+    if shutil.which("node") is None:
+        return False
+    result = subprocess.run(
+        ["node", "--experimental-strip-types", "-e", ""], capture_output=True
+    )
+    return result.returncode == 0
+
+
+def test_python_hashes_match_the_vectors():
+    for vector in load_vectors():
+        assert compute_offer_hash(vector["offer"]) == vector["hash"]
+
+
+@pytest.mark.skipif(
+    not node_can_run_typescript(),
+    reason="needs a Node.js version that can strip TypeScript types (>= 22.6)",
+)
+def test_extension_hashes_match_the_vectors():
+    vectors = load_vectors()
+    script = HASH_OFFERS_SCRIPT % json.dumps(
+        "file://" + os.path.abspath(EXTENSION_HASHING_FILE)
+    )
+
+    result = subprocess.run(
+        ["node", "--experimental-strip-types", "--input-type=module", "-e", script],
+        input=json.dumps([vector["offer"] for vector in vectors]),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert json.loads(result.stdout) == [vector["hash"] for vector in vectors]
@@ -0,0 +1,25 @@
+import pytest
+from salary_rules import parse_salary
+
+
+@pytest.mark.parametrize(
+    "salary",
+    ["60000", "60k", "100000 CHF", "CHF 50'000", "4000 - 60000", "80'000 CHF brut"],
+)
+def test_yearly_amounts_are_left_to_the_llm(salary: str):
+    assert parse_salary(salary) == (False, None)
+
+
+@pytest.mark.parametrize(
+    "salary, expected",
+    [
+        ("3000", 3000),
+        ("CHF 4'500.- / month", 4500),
+        ("2000-3000 CHF", 2000),
+        ("15000", 15000),
+        ("unpaid", 0),
+        ("", None),
+    ],
+)
+def test_monthly_salaries_are_resolved(salary: str, expected: float | None):
+    assert parse_salary(salary) == (True, expected)
@@ -0,0 +1,41 @@
+import asyncio
+
+import single_flight
+from benchmark.fake_firestore import FakeFirestore
+from normalization_cache import NormalizationCache
+from single_flight import coalesce_many
+
+
+def test_concurrent_requests_compute_each_string_once(monkeypatch):
+    monkeypatch.setattr(single_flight, "POLL_INTERVAL", 0.01)
+    db = FakeFirestore()
+    locations_cache = NormalizationCache("test_locations", "v1")
+    salaries_cache = NormalizationCache("test_salaries", "v1")
+    computed: list[str] = []
+
+    async def compute(raws_by_cache: dict[NormalizationCache, list[str]]) -> None:
+        await asyncio.sleep(0.05)
+        for cache, raws in raws_by_cache.items():
+            computed.extend(raws)
+            cache.set_many(db, {raw: raw.upper() for raw in raws})
+
+    async def request():
+        return await coalesce_many(
+            db,
+            {locations_cache: ["lausanne", "geneva"], salaries_cache: ["a lot"]},
+            compute,
+        )
+
+    async def run():
+        return await asyncio.gather(request(), request())
+
+    first, second = asyncio.run(run())
+
+    assert sorted(computed) == ["a lot", "geneva", "lausanne"]
+    # Each request waited for the values claimed by the other one.
+    for cache, expected in (
+        (locations_cache, {"lausanne": "LAUSANNE", "geneva": "GENEVA"}),
+        (salaries_cache, {"a lot": "A LOT"}),
+    ):
+        assert first[cache].keys().isdisjoint(second[cache])
+        assert first[cache] | second[cache] == expected
@@ -0,0 +1,206 @@
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Any, Callable, Iterator, ParamSpec, TypeVar
+
+# Lightweight tracing of the requests: the stages of a request are recorded as
+# spans and the LLM requests and cache lookups as events. Everything is printed as
+# one JSON object per line, which Cloud Logging stores as structured logs.
+
+TRACING_ENABLED = os.getenv("TRACING", "true") != "false"
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+
+def _log(entry: dict[str, Any]) -> None:
+    print(json.dumps({"severity": "INFO", **entry}, default=str))
+
+
+class Trace:
+    """
+    The spans, events and counters of one request. Can be shared by the threads
+    and the tasks working on the request.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.trace_id = uuid.uuid4().hex
+        self.start = time.perf_counter()
+        self.stages: dict[str, float] = {}
+        self.counters: dict[str, float] = {}
+        self.detached = False
+        self._finished = False
+        self._lock = threading.Lock()
+
+    def _elapsed_ms(self, since: float) -> float:
+        return round((time.perf_counter() - since) * 1000, 2)
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[dict[str, Any]]:
+        """
+        Time a stage of the request. Attributes can be added to the yielded dict.
+        """
+        start = time.perf_counter()
+        attributes = dict(attributes)
+        error: str | None = None
+        try:
+            yield attributes
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            duration = self._elapsed_ms(start)
+            with self._lock:
+                self.stages[name] = self.stages.get(name, 0) + duration
+            _log(
+                {
+                    "message": f"span {name}",
+                    "trace": self.trace_id,
+                    "request": self.name,
+                    "span": name,
+                    "startMs": round((start - self.start) * 1000, 2),
+                    "durationMs": duration,
+                    **({"error": error} if error else {}),
+                    **attributes,
+                }
+            )
+
+    def event(self, name: str, **attributes: Any) -> None:
+        _log(
+            {
+                "message": f"event {name}",
+                "trace": self.trace_id,
+                "request": self.name,
+                "event": name,
+                "atMs": self._elapsed_ms(self.start),
+                **attributes,
+            }
+        )
+
+    def add(self, **counters: float) -> None:
+        with self._lock:
+            for name, value in counters.items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def run(self, fn: Callable[P, R], *args: P.args, **kwargs: P.kwargs) -> R:
+        """Run a function with this trace as the current one, e.g. in a thread."""
+        token = _current_trace.set(self)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current_trace.reset(token)
+
+    def finish(self) -> None:
+        with self._lock:
+            if self._finished:
+                return
+            self._finished = True
+            stages = dict(self.stages)
+            counters = dict(self.counters)
+
+        hits = counters.get("cacheHits", 0)
+        lookups = hits + counters.get("cacheMisses", 0)
+        _log(
+            {
+                "message": f"trace {self.name}",
+                "trace": self.trace_id,
+                "request": self.name,
+                "durationMs": self._elapsed_ms(self.start),
+                "stagesMs": stages,
+                "counters": counters,
+                "cacheHitRatio": round(hits / lookups, 3) if lookups else None,
+            }
+        )
+
+
+_current_trace: contextvars.ContextVar[Trace | None] = contextvars.ContextVar(
+    "current_trace", default=None
+)
+
+
+def current_trace() -> Trace | None:
+    return _current_trace.get()
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes: Any) -> Iterator[dict[str, Any]]:
+    """Time a stage of the current request, if any."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield dict(attributes)
+        return
+    with trace.span(name, **attributes) as span_attributes:
+        yield span_attributes
+
+
+def event(name: str, **attributes: Any) -> None:
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.event(name, **attributes)
+
+
+def add(**counters: float) -> None:
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(**counters)
+
+
+def run_in(
+    trace: Trace | None, fn: Callable[P, R], *args: P.args, **kwargs: P.kwargs
+) -> R:
+    """Run a function with a trace as the current one, if any."""
+    if trace is None:
+        return fn(*args, **kwargs)
+    return trace.run(fn, *args, **kwargs)
+
+
+def detach() -> Trace | None:
+    """
+    Keep the current trace open after the request handler returns, e.g. for a
+    streamed response. The caller must finish it.
+    """
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.detached = True
+    return trace
+
+
+def traced(name: str) -> Callable[[Callable[P, R]], Callable[P, R]]:
+    """Trace each call of a request handler."""
+
+    def decorator(fn: Callable[P, R]) -> Callable[P, R]:
+        @functools.wraps(fn)
+        def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            if not TRACING_ENABLED:
+                return fn(*args, **kwargs)
+
+            trace = Trace(name)
+            token = _current_trace.set(trace)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _current_trace.reset(token)
+                if not trace.detached:
+                    trace.finish()
+
+        return wrapper
+
+    return decorator
+
+
+__all__ = [
+    "Trace",
+    "add",
+    "current_trace",
+    "detach",
+    "event",
+    "run_in",
+    "span",
+    "traced",
+]